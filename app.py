@@ -1,17 +1,34 @@
-from htm_dashboard.layout import layout
-from htm_dashboard import ACTIVE_GROUPS
+from htm_dashboard.layout import layout, create_render_tabs_function
+from htm_dashboard import ACTIVE_GROUPS, FUSED_CALLBACKS, WARM_START, LAZY_TABS
+from htm_dashboard import CLIENTSIDE_PANELS
+from htm_dashboard.export import register_export_route
+from htm_dashboard.metrics import instrument, register_metrics_route
+from htm_dashboard.tab import EXPORT_LABELS
 import htm_dashboard.callbacks as cb
 
+import logging
+
 import dash
 import dash_bootstrap_components as dbc
 from dash_bootstrap_templates import ThemeSwitchAIO
 
+logging.basicConfig(level=logging.INFO)
+
 # stylesheet with the .dbc class
 dbc_css = "https://cdn.jsdelivr.net/gh/AnnMarieW/dash-bootstrap-templates/dbc.min.css"
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.MINTY, dbc_css])
+# with lazy tabs, the callbacks refer to components that aren't rendered yet
+app = dash.Dash(
+    __name__,
+    external_stylesheets=[dbc.themes.MINTY, dbc_css],
+    suppress_callback_exceptions=LAZY_TABS,
+)
 
 server = app.server
+# the JSON exports are streamed by the server instead of a callback
+register_export_route(server)
+# timings of the callbacks, in the Prometheus text format
+register_metrics_route(server)
 
 app.layout = layout
 
@@ -21,90 +38,202 @@ app.layout = layout
     dash.Input("open-sm", "n_clicks"),
     dash.State("modal-infos", "is_open"),
 )
+@instrument
 def toggle_modal(n1, is_open):
     if n1:
         return not is_open
     return is_open
 
 
+if LAZY_TABS:
+    app.callback(
+        [dash.Output(f"tab_content_{group}", "children") for group in ACTIVE_GROUPS],
+        dash.Output("rendered_tabs", "data"),
+        dash.Input("tabs-example-graph", "active_tab"),
+        dash.State("rendered_tabs", "data"),
+        dash.State(ThemeSwitchAIO.ids.switch("theme"), "value"),
+        prevent_initial_call=True,
+    )(instrument(create_render_tabs_function()))
+
+
+def panels_outputs(group):
+    """Returns the outputs of the per year histogram and the pie charts of a
+    tab, or of their data when they are computed in the browser"""
+    if CLIENTSIDE_PANELS:
+        return [dash.Output(f"panels_data_{group}", "data")]
+    return [
+        dash.Output(f"graph_prop_per_year_{group}", "figure"),
+        dash.Output(f"graph_materials_{group}", "figure"),
+        dash.Output(f"graph_isotopes_{group}", "figure"),
+        dash.Output(f"graph_authors_{group}", "figure"),
+    ]
+
+
+def year_bin_width_inputs(group):
+    """Returns the input of the width of the bins of the per year histogram
+    of a tab when the histogram is computed on the server"""
+    if CLIENTSIDE_PANELS:
+        return []
+    return [dash.Input(f"year_bin_width_{group}", "value")]
+
+
 for group in ACTIVE_GROUPS:
+    if FUSED_CALLBACKS:
+        # one request per interaction returning the graph and all the panels
+        app.callback(
+            dash.Output(f"graph_{group}", "figure"),
+            dash.Output(f"graph_nb_citations_{group}", "figure"),
+            *panels_outputs(group),
+            dash.Input(f"material_filter_{group}", "value"),
+            dash.Input(f"isotope_filter_{group}", "value"),
+            dash.Input(f"author_filter_{group}", "value"),
+            dash.Input(f"year_filter_{group}", "value"),
+            dash.Input(f"mean_button_{group}", "n_clicks"),
+            dash.Input(f"colour-by_{group}", "value"),
+            dash.Input(ThemeSwitchAIO.ids.switch("theme"), "value"),
+            dash.Input(f"per_year_citations_{group}", "on"),
+            # the browser bins the histogram when it computes the panels
+            *year_bin_width_inputs(group),
+            prevent_initial_call=WARM_START,
+        )(instrument(cb.create_update_tab_function(group), group))
+    else:
+        app.callback(
+            dash.Output(f"graph_{group}", "figure"),
+            dash.Input(f"material_filter_{group}", "value"),
+            dash.Input(f"isotope_filter_{group}", "value"),
+            dash.Input(f"author_filter_{group}", "value"),
+            dash.Input(f"year_filter_{group}", "value"),
+            dash.Input(f"mean_button_{group}", "n_clicks"),
+            dash.Input(f"colour-by_{group}", "value"),
+            dash.Input(ThemeSwitchAIO.ids.switch("theme"), "value"),
+            prevent_initial_call=WARM_START,
+        )(instrument(cb.create_update_graph_function(group), group))
 
-    app.callback(
-        dash.Output(f"graph_nb_citations_{group}", "figure"),
-        dash.Input(f"graph_{group}", "figure"),
-        dash.Input(f"per_year_citations_{group}", "on"),
-        dash.State(f"material_filter_{group}", "value"),
-        dash.State(f"isotope_filter_{group}", "value"),
-        dash.State(f"author_filter_{group}", "value"),
-        dash.State(f"year_filter_{group}", "value"),
-    )(cb.create_make_citations_figure_function(group))
+        app.callback(
+            dash.Output(f"graph_nb_citations_{group}", "figure"),
+            dash.Input(f"graph_{group}", "figure"),
+            dash.Input(f"per_year_citations_{group}", "on"),
+            dash.State(f"material_filter_{group}", "value"),
+            dash.State(f"isotope_filter_{group}", "value"),
+            dash.State(f"author_filter_{group}", "value"),
+            dash.State(f"year_filter_{group}", "value"),
+            prevent_initial_call=WARM_START,
+        )(instrument(cb.create_make_citations_figure_function(group), group))
 
-    app.callback(
-        dash.Output(f"material_filter_{group}", "value"),
-        dash.Input(f"add_all_materials_{group}", "n_clicks"),
-    )(cb.create_add_all_materials_function(group))
+        if CLIENTSIDE_PANELS:
+            app.callback(
+                dash.Output(f"panels_data_{group}", "data"),
+                dash.Input(f"material_filter_{group}", "value"),
+                dash.Input(f"isotope_filter_{group}", "value"),
+                dash.Input(f"author_filter_{group}", "value"),
+                dash.Input(f"year_filter_{group}", "value"),
+                prevent_initial_call=WARM_START,
+            )(instrument(cb.create_update_panels_data_function(group), group))
+        else:
+            app.callback(
+                dash.Output(f"graph_prop_per_year_{group}", "figure"),
+                dash.Input(f"graph_{group}", "figure"),
+                dash.State(f"material_filter_{group}", "value"),
+                dash.State(f"isotope_filter_{group}", "value"),
+                dash.State(f"author_filter_{group}", "value"),
+                dash.State(f"year_filter_{group}", "value"),
+                dash.Input(f"year_bin_width_{group}", "value"),
+                prevent_initial_call=WARM_START,
+            )(
+                instrument(
+                    cb.create_update_entries_per_year_graph_function(group), group
+                )
+            )
 
-    app.callback(
-        dash.Output(f"author_filter_{group}", "value"),
-        dash.Input(f"add_all_authors_{group}", "n_clicks"),
-    )(cb.create_add_all_authors_function(group))
+            app.callback(
+                dash.Output(f"graph_materials_{group}", "figure"),
+                dash.Input(f"graph_{group}", "figure"),
+                dash.State(f"material_filter_{group}", "value"),
+                dash.State(f"isotope_filter_{group}", "value"),
+                dash.State(f"author_filter_{group}", "value"),
+                dash.State(f"year_filter_{group}", "value"),
+                prevent_initial_call=WARM_START,
+            )(instrument(cb.create_update_piechart_material_function(group), group))
+
+            app.callback(
+                dash.Output(f"graph_isotopes_{group}", "figure"),
+                dash.Input(f"graph_{group}", "figure"),
+                dash.State(f"material_filter_{group}", "value"),
+                dash.State(f"isotope_filter_{group}", "value"),
+                dash.State(f"author_filter_{group}", "value"),
+                dash.State(f"year_filter_{group}", "value"),
+                prevent_initial_call=WARM_START,
+            )(instrument(cb.create_update_piechart_isotopes_function(group), group))
+
+            app.callback(
+                dash.Output(f"graph_authors_{group}", "figure"),
+                dash.Input(f"graph_{group}", "figure"),
+                dash.State(f"material_filter_{group}", "value"),
+                dash.State(f"isotope_filter_{group}", "value"),
+                dash.State(f"author_filter_{group}", "value"),
+                dash.State(f"year_filter_{group}", "value"),
+                prevent_initial_call=WARM_START,
+            )(instrument(cb.create_update_piechart_authors_function(group), group))
+
+    if CLIENTSIDE_PANELS:
+        # computed in the browser from the data of the tab, the template is
+        # taken from the main graph (see assets/clientside.js)
+        for panel, function_name, inputs in [
+            (
+                "prop_per_year",
+                "histogram_years",
+                [dash.Input(f"year_bin_width_{group}", "value")],
+            ),
+            ("materials", "piechart_materials", []),
+            ("isotopes", "piechart_isotopes", []),
+            ("authors", "piechart_authors", []),
+        ]:
+            app.clientside_callback(
+                dash.ClientsideFunction(namespace="htm", function_name=function_name),
+                dash.Output(f"graph_{panel}_{group}", "figure"),
+                dash.Input(f"panels_data_{group}", "data"),
+                *inputs,
+                dash.State(f"graph_{group}", "figure"),
+            )
 
+    # the table is sorted and paged on the server
     app.callback(
-        dash.Output(f"graph_{group}", "figure"),
+        dash.Output(f"table_{group}", "data"),
+        dash.Output(f"table_{group}", "page_count"),
+        dash.Output(f"table_{group}", "page_current"),
+        dash.Output(f"table_filters_{group}", "data"),
+        dash.Input(f"subtabs_{group}", "active_tab"),
+        dash.Input(f"table_{group}", "page_current"),
+        dash.Input(f"table_{group}", "page_size"),
+        dash.Input(f"table_{group}", "sort_by"),
         dash.Input(f"material_filter_{group}", "value"),
         dash.Input(f"isotope_filter_{group}", "value"),
         dash.Input(f"author_filter_{group}", "value"),
         dash.Input(f"year_filter_{group}", "value"),
-        dash.Input(f"mean_button_{group}", "n_clicks"),
-        dash.Input(f"colour-by_{group}", "value"),
-        dash.Input(ThemeSwitchAIO.ids.switch("theme"), "value"),
-    )(cb.create_update_graph_function(group))
-
-    app.callback(
-        dash.Output(f"graph_prop_per_year_{group}", "figure"),
-        dash.Input(f"graph_{group}", "figure"),
-        dash.State(f"material_filter_{group}", "value"),
-        dash.State(f"isotope_filter_{group}", "value"),
-        dash.State(f"author_filter_{group}", "value"),
-        dash.State(f"year_filter_{group}", "value"),
-    )(cb.create_update_entries_per_year_graph_function(group))
-
-    app.callback(
-        dash.Output(f"graph_materials_{group}", "figure"),
-        dash.Input(f"graph_{group}", "figure"),
-        dash.State(f"material_filter_{group}", "value"),
-        dash.State(f"isotope_filter_{group}", "value"),
-        dash.State(f"author_filter_{group}", "value"),
-        dash.State(f"year_filter_{group}", "value"),
-    )(cb.create_update_piechart_material_function(group))
+        dash.State(f"table_filters_{group}", "data"),
+        prevent_initial_call=True,
+    )(instrument(cb.create_update_table_data_function(group), group))
 
     app.callback(
-        dash.Output(f"graph_isotopes_{group}", "figure"),
-        dash.Input(f"graph_{group}", "figure"),
-        dash.State(f"material_filter_{group}", "value"),
-        dash.State(f"isotope_filter_{group}", "value"),
-        dash.State(f"author_filter_{group}", "value"),
-        dash.State(f"year_filter_{group}", "value"),
-    )(cb.create_update_piechart_isotopes_function(group))
+        dash.Output(f"material_filter_{group}", "value"),
+        dash.Input(f"add_all_materials_{group}", "n_clicks"),
+        prevent_initial_call=True,
+    )(instrument(cb.create_add_all_materials_function(group), group))
 
     app.callback(
-        dash.Output(f"graph_authors_{group}", "figure"),
-        dash.Input(f"graph_{group}", "figure"),
-        dash.State(f"material_filter_{group}", "value"),
-        dash.State(f"isotope_filter_{group}", "value"),
-        dash.State(f"author_filter_{group}", "value"),
-        dash.State(f"year_filter_{group}", "value"),
-    )(cb.create_update_piechart_authors_function(group))
+        dash.Output(f"author_filter_{group}", "value"),
+        dash.Input(f"add_all_authors_{group}", "n_clicks"),
+        prevent_initial_call=True,
+    )(instrument(cb.create_add_all_authors_function(group), group))
 
     app.callback(
-        dash.Output(f"download-text_{group}", "data"),
-        dash.Input(f"extract_button_{group}", "n_clicks"),
+        [dash.Output(f"extract_{fmt}_{group}", "href") for fmt in EXPORT_LABELS],
         dash.Input(f"material_filter_{group}", "value"),
         dash.Input(f"isotope_filter_{group}", "value"),
         dash.Input(f"author_filter_{group}", "value"),
         dash.Input(f"year_filter_{group}", "value"),
         prevent_initial_call=True,
-    )(cb.create_make_download_data_function(group))
+    )(instrument(cb.create_update_export_link_function(group), group))
 
     app.callback(
         dash.Output(f"download-python_{group}", "data"),
@@ -114,7 +243,7 @@ for group in ACTIVE_GROUPS:
         dash.Input(f"author_filter_{group}", "value"),
         dash.Input(f"year_filter_{group}", "value"),
         prevent_initial_call=True,
-    )(cb.make_download_python_callback(group))
+    )(instrument(cb.make_download_python_callback(group), group))
 
     app.callback(
         dash.Output(f"modal_add_{group}", "is_open"),
@@ -128,7 +257,7 @@ for group in ACTIVE_GROUPS:
         dash.State(f"new_{group}_isotope", "value"),
         dash.State(f"new_{group}_material", "value"),
         prevent_initial_call=True,
-    )(cb.make_toggle_modal_function(group))
+    )(instrument(cb.make_toggle_modal_function(group), group))
 
     # add property form
     # since an additional parameter is needed for solubility and permeability
@@ -150,7 +279,7 @@ for group in ACTIVE_GROUPS:
             dash.State(f"new_{group}_range_high", "value"),
             dash.State(f"new_{group}_law", "value"),
             prevent_initial_call=True,
-        )(cb.make_add_property(group))
+        )(instrument(cb.make_add_property(group), group))
     else:
         app.callback(
             dash.Output(f"material_filter_{group}", "options"),
@@ -167,16 +296,8 @@ for group in ACTIVE_GROUPS:
             dash.State(f"new_{group}_range_low", "value"),
             dash.State(f"new_{group}_range_high", "value"),
             prevent_initial_call=True,
-        )(cb.make_add_property(group))
+        )(instrument(cb.make_add_property(group), group))
 
-    app.callback(
-        dash.Output(f"table_{group}", "data"),
-        dash.Input(f"graph_{group}", "figure"),
-        dash.State(f"material_filter_{group}", "value"),
-        dash.State(f"isotope_filter_{group}", "value"),
-        dash.State(f"author_filter_{group}", "value"),
-        dash.State(f"year_filter_{group}", "value"),
-    )(cb.create_update_table_data_function(group))
 
 if __name__ == "__main__":
     # app.run_server(debug=True, host="0.0.0.0", port=8080)
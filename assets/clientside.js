@@ -0,0 +1,129 @@
+// Pie charts and per year histogram of a tab, computed in the browser from the
+// data published by the server in the panels_data store of the tab (see
+// make_panels_data in htm_dashboard/graph.py)
+
+const DEFAULT_YEAR_BIN_WIDTH = 5;
+
+function layoutOf(mainFigure, layout) {
+    // same template (light or dark) as the main graph
+    const template = mainFigure && mainFigure.layout && mainFigure.layout.template;
+    return template ? Object.assign({template: template}, layout) : layout;
+}
+
+function isSelected(data, i) {
+    const selected = data.selected_years;
+    if (!selected) {
+        return true;
+    }
+    const year = data.year[i];
+    return year !== null && selected[0] <= year && year <= selected[1];
+}
+
+function countCodes(data, field) {
+    // number of properties of the selected years for each label of field
+    const counts = new Array(data[field].labels.length).fill(0);
+    const codes = data[field].codes;
+    for (let i = 0; i < codes.length; i++) {
+        if (isSelected(data, i)) {
+            counts[codes[i]] += 1;
+        }
+    }
+    return counts;
+}
+
+function piechart(data, mainFigure, field) {
+    if (!data) {
+        return window.dash_clientside.no_update;
+    }
+    const counts = countCodes(data, field);
+    const labels = [];
+    const values = [];
+    const colours = [];
+    counts.forEach((count, code) => {
+        if (count > 0) {
+            labels.push(data[field].labels[code]);
+            values.push(count);
+            colours.push(data[field].colours[code]);
+        }
+    });
+    return {
+        data: [{type: "pie", labels: labels, values: values, marker: {colors: colours}}],
+        layout: layoutOf(mainFigure, {}),
+    };
+}
+
+function piechartIsotopes(data, mainFigure) {
+    if (!data) {
+        return window.dash_clientside.no_update;
+    }
+    const counts = countCodes(data, "isotope");
+    const labels = ["H", "D", "T"];
+    const values = labels.map((isotope) => {
+        const code = data.isotope.labels.indexOf(isotope);
+        return code === -1 ? 0 : counts[code];
+    });
+    return {
+        data: [{type: "pie", labels: labels, values: values}],
+        layout: layoutOf(mainFigure, {}),
+    };
+}
+
+function histogramYears(data, binWidth, mainFigure) {
+    if (!data) {
+        return window.dash_clientside.no_update;
+    }
+    // same bins as year_bins in htm_dashboard/graph.py: aligned on multiples
+    // of the width and counted from the cumulative counts per year
+    const step = binWidth || DEFAULT_YEAR_BIN_WIDTH;
+    const first = data.year_counts.first;
+    const cumulative = data.year_counts.cumulative;
+    const cumulativeAt = (year) => {
+        const k = Math.min(Math.max(year - first, 0), cumulative.length - 1);
+        return cumulative[k];
+    };
+
+    const selected = data.selected_years || [-Infinity, Infinity];
+    const centers = [];
+    const counts = [];
+    const hovertemplates = [];
+    const selectedPoints = [];
+    if (first !== null) {
+        const last = first + cumulative.length - 2;
+        for (let start = Math.floor(first / step) * step; start <= last; start += step) {
+            const end = start + step - 1;
+            const center = 0.5 * (start + end);
+            centers.push(center);
+            counts.push(cumulativeAt(start + step) - cumulativeAt(start));
+            const years = step === 1 ? `${start}` : `${start} - ${end}`;
+            hovertemplates.push(`<br>${years}</br><extra></extra>%{y}`);
+            if (selected[0] <= center && center <= selected[1]) {
+                selectedPoints.push(centers.length - 1);
+            }
+        }
+    }
+    return {
+        data: [
+            {
+                type: "bar",
+                x: centers,
+                y: counts,
+                width: step,
+                selectedpoints: selectedPoints,
+                hovertemplate: hovertemplates,
+            },
+        ],
+        layout: layoutOf(mainFigure, {
+            bargap: 0,
+            yaxis: {title: {text: "Nb of properties"}},
+        }),
+    };
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    htm: {
+        histogram_years: histogramYears,
+        piechart_materials: (data, mainFigure) => piechart(data, mainFigure, "material"),
+        piechart_isotopes: piechartIsotopes,
+        piechart_authors: (data, mainFigure) => piechart(data, mainFigure, "author"),
+    },
+});
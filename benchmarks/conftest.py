@@ -0,0 +1,92 @@
+import copy
+
+import h_transport_materials as htm
+import pytest
+
+from htm_dashboard.graph import (
+    filter_cache,
+    figure_cache,
+    make_snapshot,
+    publish_snapshot,
+    type_to_snapshot,
+)
+from htm_dashboard.tab import initial_filters
+
+GROUP = "diffusivity"
+
+# number of copies of the database and number of rounds of the benchmarks
+SCALES = {1: 5, 10: 3, 100: 1}
+
+
+def scale_database(database, factor: int) -> htm.PropertiesGroup:
+    """Makes a synthetic database with factor copies of each property, the
+    copies being attributed to new authors (eg. "smith1", "smith2"...)
+
+    Args:
+        database (htm.PropertiesGroup): the original properties
+        factor (int): the number of copies
+
+    Returns:
+        htm.PropertiesGroup: the synthetic database
+    """
+    props = []
+    for i in range(factor):
+        for prop in database:
+            new_prop = copy.copy(prop)
+            if i > 0:
+                new_prop.author = f"{prop.author}{i}"
+            props.append(new_prop)
+    return htm.PropertiesGroup(props)
+
+
+@pytest.fixture(scope="module", params=list(SCALES), ids=lambda scale: f"{scale}x")
+def scale(request):
+    """Replaces the database of GROUP by a synthetic one for the tests of a
+    module"""
+    original = type_to_snapshot[GROUP]
+    if request.param > 1:
+        publish_snapshot(
+            GROUP, make_snapshot(scale_database(original.database, request.param))
+        )
+    yield request.param
+    publish_snapshot(GROUP, original)
+
+
+def make_selections(group: str) -> dict:
+    """Returns the (materials, isotopes, authors, years) filters of the
+    benchmarked selections"""
+    filters = initial_filters(group)
+    isotopes, years = filters["isotopes"], filters["years"]
+    all_authors = type_to_snapshot[group].facets.authors()
+    all_materials = type_to_snapshot[group].facets.materials()
+    return {
+        "single_material": (filters["materials"], isotopes, filters["authors"], years),
+        "all_authors": (filters["materials"], isotopes, all_authors, years),
+        "all_materials": (all_materials, isotopes, all_authors, years),
+        "narrow_years": (all_materials, isotopes, all_authors, [2000, 2010]),
+    }
+
+
+SELECTIONS = ["single_material", "all_authors", "all_materials", "narrow_years"]
+
+
+@pytest.fixture(params=SELECTIONS)
+def filters(request, scale):
+    return make_selections(GROUP)[request.param]
+
+
+@pytest.fixture
+def run(benchmark, scale):
+    """Benchmarks a function with empty filter and figure caches, so that
+    every round measures the full computation"""
+
+    def clear_caches():
+        filter_cache.invalidate()
+        figure_cache.invalidate()
+
+    def run(function, *args):
+        return benchmark.pedantic(
+            function, args=args, setup=clear_caches, rounds=SCALES[scale], iterations=1
+        )
+
+    return run
@@ -0,0 +1,147 @@
+"""Benchmarks of the callbacks of a tab, run with
+
+    pytest benchmarks --benchmark-autosave
+
+and compared with the last saved run with
+
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=median:25%
+
+The synthetic databases are 1x, 10x and 100x the size of the diffusivities,
+eg. "-k 'not 100x'" skips the slowest benchmarks.
+"""
+
+from contextvars import copy_context
+
+import pytest
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+
+import htm_dashboard.callbacks as cb
+from htm_dashboard.export import iter_json_export
+from htm_dashboard.graph import (
+    get_selection,
+    property_store,
+    publish_snapshot,
+    type_to_snapshot,
+)
+from htm_dashboard.query import FilterQuery
+
+from conftest import GROUP
+
+
+def triggered_by(prop_id, function):
+    """Returns function run as a callback triggered by prop_id"""
+
+    def run_callback(*args):
+        def callback():
+            context_value.set(AttributeDict(triggered_inputs=[{"prop_id": prop_id}]))
+            return function(*args)
+
+        return copy_context().run(callback)
+
+    return run_callback
+
+
+@pytest.mark.parametrize("mean", [False, True], ids=["no_mean", "mean"])
+def test_update_graph(run, filters, mean):
+    if mean:
+        trigger = f"mean_button_{GROUP}.n_clicks"
+    else:
+        trigger = f"material_filter_{GROUP}.value"
+    update_graph = triggered_by(trigger, cb.create_update_graph_function(GROUP))
+    figure = run(update_graph, *filters, 1, "property", True)
+    assert len(figure["data"]) > 0
+
+
+def test_update_entries_per_year_graph(run, filters):
+    update = cb.create_update_entries_per_year_graph_function(GROUP)
+    run(update, None, *filters)
+
+
+@pytest.mark.parametrize(
+    "factory",
+    [
+        cb.create_update_piechart_material_function,
+        cb.create_update_piechart_isotopes_function,
+        cb.create_update_piechart_authors_function,
+    ],
+    ids=["materials", "isotopes", "authors"],
+)
+def test_update_piechart(run, filters, factory):
+    run(factory(GROUP), None, *filters)
+
+
+def test_update_panels_data(run, filters):
+    update_panels_data = cb.create_update_panels_data_function(GROUP)
+    run(update_panels_data, *filters)
+
+
+@pytest.mark.parametrize("per_year", [False, True], ids=["total", "per_year"])
+def test_citations_figure(run, filters, per_year):
+    make_citations_figure = cb.create_make_citations_figure_function(GROUP)
+    run(make_citations_figure, None, per_year, *filters)
+
+
+@pytest.mark.parametrize("sort_by", [[], [{"column_id": "author", "direction": "asc"}]])
+def test_update_table_data(run, filters, sort_by):
+    update_table_data = triggered_by(
+        f"table_{GROUP}.page_current", cb.create_update_table_data_function(GROUP)
+    )
+    rows, page_count, page_current, _ = run(
+        update_table_data, "table", 0, 20, sort_by, *filters, None
+    )
+    assert page_current == 0
+
+
+def test_update_tab(run, filters):
+    update_tab = triggered_by(
+        f"material_filter_{GROUP}.value", cb.create_update_tab_function(GROUP)
+    )
+    run(update_tab, *filters, None, "property", True, False)
+
+
+def test_download_python(run, filters):
+    download_python = triggered_by(
+        f"python_button_{GROUP}.n_clicks", cb.make_download_python_callback(GROUP)
+    )
+    run(download_python, 1, *filters)
+
+
+def test_export_json(run, filters):
+    materials, isotopes, authors, years = filters
+    query = FilterQuery.from_filters(materials, authors, isotopes, years)
+
+    def export():
+        selection = get_selection(GROUP, query)
+        return "".join(iter_json_export(selection.group, query))
+
+    run(export)
+
+
+def test_add_property(run, scale):
+    add_property = triggered_by(
+        f"submit_new_{GROUP}.n_clicks", cb.make_add_property(GROUP)
+    )
+    snapshot = type_to_snapshot[GROUP]
+    last_id = property_store.last_id(GROUP)
+    try:
+        run(
+            add_property,
+            1,
+            ["tungsten"],
+            1e-7,
+            0.2,
+            "smith",
+            2020,
+            "H",
+            "tungsten",
+            300,
+            1200,
+        )
+    finally:
+        # the added properties aren't added back by the next benchmarks
+        with property_store.connection:
+            property_store.connection.execute(
+                "DELETE FROM properties WHERE id > ?", (last_id,)
+            )
+        publish_snapshot(GROUP, snapshot)
@@ -0,0 +1,47 @@
+"""gunicorn configuration, run with
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+"""
+
+import multiprocessing
+import os
+
+# the workers share the added properties and the cached graphs
+os.environ.setdefault("HTM_DASHBOARD_STORE_FILE", "/tmp/htm_dashboard.sqlite")
+os.environ.setdefault("HTM_DASHBOARD_FIGURE_CACHE_DIR", "/tmp/htm_dashboard_figures")
+
+from htm_dashboard import WORKER_MEMORY_BUDGET, WORKER_MEMORY_CHECK_INTERVAL
+from htm_dashboard.memory import memory_usage
+
+bind = f":{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = 8
+# Cloud Run handles the scaling of the instances
+timeout = 0
+# the app is loaded before forking the workers, see wsgi.py
+preload_app = True
+
+
+def _megabytes(value):
+    return value / 2**20
+
+
+def when_ready(server):
+    usage = memory_usage()
+    server.log.info(f"App loaded, master rss: {_megabytes(usage['rss']):.0f} MB")
+
+
+def post_request(worker, req, environ, resp):
+    worker.nr_requests = getattr(worker, "nr_requests", 0) + 1
+    if not WORKER_MEMORY_BUDGET:
+        return
+    if worker.nr_requests % WORKER_MEMORY_CHECK_INTERVAL:
+        return
+    private = _megabytes(memory_usage()["private"])
+    if private > WORKER_MEMORY_BUDGET:
+        # the worker finishes its requests and is replaced by a fresh fork
+        worker.log.warning(
+            f"Worker {worker.pid} uses {private:.0f} MB of private memory "
+            f"(budget: {WORKER_MEMORY_BUDGET:.0f} MB), restarting it"
+        )
+        worker.alive = False
@@ -1,3 +1,5 @@
+import os
+
 ACTIVE_GROUPS = [
     "diffusivity",
     "solubility",
@@ -5,3 +7,68 @@ ACTIVE_GROUPS = [
     "recombination_coeff",
     "dissociation_coeff",
 ]
+
+# if True, each tab is updated by a single callback returning the graph and
+# all the panels instead of one callback per panel
+FUSED_CALLBACKS = os.environ.get("HTM_DASHBOARD_FUSED_CALLBACKS", "0") == "1"
+
+# server-side cache of the main graphs
+FIGURE_CACHE_SIZE = int(os.environ.get("HTM_DASHBOARD_FIGURE_CACHE_SIZE", "64"))
+# time to live of the cached graphs in seconds, no expiry if not set
+FIGURE_CACHE_TTL = os.environ.get("HTM_DASHBOARD_FIGURE_CACHE_TTL")
+if FIGURE_CACHE_TTL is not None:
+    FIGURE_CACHE_TTL = float(FIGURE_CACHE_TTL)
+# directory shared between the workers where the graphs are also cached
+FIGURE_CACHE_DIR = os.environ.get("HTM_DASHBOARD_FIGURE_CACHE_DIR")
+
+# if True, the server sends the columnar data of the pie charts and of the per
+# year histogram and the browser computes them
+CLIENTSIDE_PANELS = os.environ.get("HTM_DASHBOARD_CLIENTSIDE_PANELS", "1") == "1"
+
+# if True, the options of the material and author filters show their number of
+# properties (eg. "tungsten (42)")
+FACET_COUNTS = os.environ.get("HTM_DASHBOARD_FACET_COUNTS", "0") == "1"
+
+# number of most cited references shown by the citations graphs, the others
+# being aggregated in a single bar, 0 to show all the references
+CITATIONS_TOP = int(os.environ.get("HTM_DASHBOARD_CITATIONS_TOP", "30"))
+
+# if True, the initial graphs are computed at startup and
+# included in the layout instead of being computed by the initial callbacks
+WARM_START = os.environ.get("HTM_DASHBOARD_WARM_START", "1") == "1"
+
+# if True, the content of a tab is only rendered when the tab is first opened
+LAZY_TABS = os.environ.get("HTM_DASHBOARD_LAZY_TABS", "1") == "1"
+
+# the curves of the main graphs are decimated so that their error in log10(y)
+# stays below this tolerance (in decades), 0 to keep all the points
+CURVE_TOLERANCE = float(os.environ.get("HTM_DASHBOARD_CURVE_TOLERANCE", "0.001"))
+# minimum number of points per curve, so that the hover labels follow the curves
+CURVE_MIN_POINTS = int(os.environ.get("HTM_DASHBOARD_CURVE_MIN_POINTS", "50"))
+# significant digits of the coordinates of the curves, 0 to disable rounding
+SIGNIFICANT_DIGITS = int(os.environ.get("HTM_DASHBOARD_SIGNIFICANT_DIGITS", "6"))
+
+# if True, the figures sent to the browser are compacted: repeated labels
+# become scalars and the unused parts of the templates are removed
+COMPACT_FIGURES = os.environ.get("HTM_DASHBOARD_COMPACT_FIGURES", "0") == "1"
+
+# SQLite file storing the properties added by the users, shared between the
+# workers. If not set, the added properties are kept in memory by each worker
+STORE_FILE = os.environ.get("HTM_DASHBOARD_STORE_FILE")
+# the workers check the store for new properties at most every this many seconds
+STORE_POLL_INTERVAL = float(os.environ.get("HTM_DASHBOARD_STORE_POLL_INTERVAL", "1"))
+
+# private memory (MB) above which a gunicorn worker is replaced, checked every
+# WORKER_MEMORY_CHECK_INTERVAL requests (see gunicorn.conf.py)
+WORKER_MEMORY_BUDGET = float(os.environ.get("HTM_DASHBOARD_WORKER_MEMORY_BUDGET", "0"))
+WORKER_MEMORY_CHECK_INTERVAL = int(
+    os.environ.get("HTM_DASHBOARD_WORKER_MEMORY_CHECK_INTERVAL", "100")
+)
+
+# if True, the callbacks are timed and their metrics exposed on /metrics, which
+# isn't authenticated
+METRICS = os.environ.get("HTM_DASHBOARD_METRICS", "0") == "1"
+# callbacks slower than this many seconds are logged, if set and METRICS is True
+SLOW_CALLBACK_THRESHOLD = os.environ.get("HTM_DASHBOARD_SLOW_CALLBACK_THRESHOLD")
+if SLOW_CALLBACK_THRESHOLD is not None:
+    SLOW_CALLBACK_THRESHOLD = float(SLOW_CALLBACK_THRESHOLD)
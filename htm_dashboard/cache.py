@@ -0,0 +1,217 @@
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import plotly.io as pio
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache
+
+    Args:
+        maxsize (int, optional): maximum number of entries kept in the cache.
+            Defaults to 128.
+        ttl (float, optional): time to live of the entries in seconds. If None,
+            entries never expire. Defaults to None.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            expires_at, value = self._entries[key]
+            if expires_at is not None and time.monotonic() > expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached value for key, computing and storing it if needed
+
+        Args:
+            key (hashable): the cache key
+            compute (callable): function without arguments returning the value
+
+        Returns:
+            the cached or computed value
+        """
+        value = self.get(key, default=_MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, predicate=None):
+        """Removes entries from the cache
+
+        Args:
+            predicate (callable, optional): function taking a key and returning
+                True if the entry should be removed. If None, the whole cache is
+                cleared. Defaults to None.
+        """
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+
+_MISSING = object()
+
+
+def _to_dict(figure) -> dict:
+    return json.loads(pio.to_json(figure, validate=False))
+
+
+class DiskCache:
+    """Cache of JSON serializable values stored as files in a directory, so
+    that it can be shared between processes
+
+    Args:
+        directory (str): the directory where the entries are stored
+        ttl (float, optional): time to live of the entries in seconds. If None,
+            entries never expire. Defaults to None.
+        maxsize (int, optional): maximum number of files kept in the directory,
+            the oldest ones are removed first. Defaults to 512.
+    """
+
+    def __init__(self, directory, ttl: float = None, maxsize: int = 512):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.maxsize = maxsize
+
+    def _filename(self, key) -> Path:
+        # repr of tuples of builtins is the same in all processes
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return self.directory / f"{digest}.json"
+
+    def get(self, key, default=None):
+        filename = self._filename(key)
+        try:
+            age = time.time() - filename.stat().st_mtime
+            if self.ttl is not None and age > self.ttl:
+                filename.unlink(missing_ok=True)
+                return default
+            with open(filename) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return default
+
+    def set(self, key, value):
+        """Stores a value
+
+        Args:
+            key (hashable): the key, a tuple of builtins
+            value: the JSON serializable value
+        """
+        # write to a temporary file first so that readers never see a partial file
+        fd, tmp_filename = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_filename, self._filename(key))
+        self._prune()
+
+    def _prune(self):
+        filenames = list(self.directory.glob("*.json"))
+        if len(filenames) <= self.maxsize:
+            return
+        filenames.sort(key=lambda filename: filename.stat().st_mtime)
+        for filename in filenames[: len(filenames) - self.maxsize]:
+            filename.unlink(missing_ok=True)
+
+    def clear(self):
+        for filename in self.directory.glob("*.json"):
+            filename.unlink(missing_ok=True)
+
+
+class FigureCache:
+    """Cache of serialized figures, kept in memory and optionally in a
+    directory shared between the workers
+
+    Args:
+        maxsize (int, optional): maximum number of figures kept in memory.
+            Defaults to 64.
+        ttl (float, optional): time to live of the figures in seconds. If None,
+            figures never expire. Defaults to None.
+        directory (str, optional): if given, figures are also stored in this
+            directory. Defaults to None.
+        serialize (callable, optional): function converting a figure to a
+            JSON serializable dict. Defaults to None (plotly's JSON encoding).
+    """
+
+    def __init__(
+        self, maxsize: int = 64, ttl: float = None, directory=None, serialize=None
+    ):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.disk = None if directory is None else DiskCache(directory, ttl=ttl)
+        self.serialize = serialize or _to_dict
+
+    def get(self, key):
+        """Returns the figure as a dict, None if it isn't cached"""
+        figure = self.memory.get(key)
+        if figure is None and self.disk is not None:
+            figure = self.disk.get(key)
+            if figure is not None:
+                self.memory.set(key, figure)
+        return figure
+
+    def set(self, key, figure):
+        """Stores a figure
+
+        Args:
+            key (hashable): the key, a tuple of builtins
+            figure (go.Figure): the figure
+
+        Returns:
+            dict: the serialized figure
+        """
+        figure = self.serialize(figure)
+        self.memory.set(key, figure)
+        if self.disk is not None:
+            self.disk.set(key, figure)
+        return figure
+
+    def invalidate(self, predicate=None):
+        """Removes figures from the memory cache. Entries of the shared
+        directory are not removed, their keys should contain the state of the
+        database so that they are never hit once the database changed.
+
+        Args:
+            predicate (callable, optional): function taking a key and returning
+                True if the entry should be removed. If None, the whole cache is
+                cleared. Defaults to None.
+        """
+        self.memory.invalidate(predicate)
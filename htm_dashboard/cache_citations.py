@@ -1,13 +1,232 @@
-import h_transport_materials as htm
-from datetime import date
+"""Refreshes the number of citations of the DOIs of the HTM database in
+citations.json, run monthly by .github/workflows/cache_citations.yml with
+
+    python htm_dashboard/cache_citations.py
+
+Only the new DOIs and those fetched more than --max-age days ago are looked
+up on Crossref, concurrently. The file is saved every --checkpoint-every
+lookups so that an interrupted run resumes where it stopped.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
 import json
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import h_transport_materials as htm
+
+CITATIONS_FILE = Path(__file__).parent / "citations.json"
+
+CROSSREF_URL = "https://api.crossref.org"
+USER_AGENT = (
+    "h-transport-materials-dashboard "
+    "(https://github.com/RemDelaporteMathurin/h-transport-materials-dashboard)"
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CrossrefFetcher:
+    """Returns the number of citations of a DOI from the Crossref REST API
+
+    Args:
+        base_url (str, optional): the URL of the API, eg. a local stub
+            server. Defaults to CROSSREF_URL.
+        timeout (float, optional): timeout of a request in seconds.
+            Defaults to 30.
+    """
+
+    def __init__(self, base_url=CROSSREF_URL, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def __call__(self, doi: str) -> int:
+        url = f"{self.base_url}/works/{urllib.parse.quote(doi)}"
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                record = json.load(response)
+        except urllib.error.HTTPError as error:
+            if error.code == 404:
+                # unknown to Crossref
+                return 0
+            raise
+        return record["message"]["is-referenced-by-count"]
+
+
+class RateLimiter:
+    """Spaces the calls of wait() shared between threads
+
+    Args:
+        rate (float): maximum number of calls per second, no limit if None
+    """
+
+    def __init__(self, rate: float = None):
+        self.interval = 1 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def load_citations(filename) -> dict:
+    """Reads a citations file, empty if it doesn't exist
+
+    Returns:
+        dict: the date of the last complete refresh, the number of citations
+            of each DOI and the time each DOI was fetched (ISO format)
+    """
+    try:
+        with open(filename) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {}
+    data.setdefault("date", None)
+    data.setdefault("dois", {})
+    data.setdefault("fetched", {})
+    return data
+
+
+def save_citations(data: dict, filename):
+    """Writes a citations file atomically, so that the dashboard never reads a
+    partially written file"""
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w") as outfile:
+        json.dump(data, outfile, indent=4)
+    os.replace(tmp_filename, filename)
+
+
+def stale_dois(dois, data: dict, max_age: timedelta, now: datetime) -> list:
+    """Returns the DOIs never fetched or fetched more than max_age ago"""
+    stale = []
+    for doi in dois:
+        fetched = data["fetched"].get(doi)
+        if fetched is None or now - datetime.fromisoformat(fetched) > max_age:
+            stale.append(doi)
+    return stale
+
+
+def refresh_citations(
+    dois,
+    filename=CITATIONS_FILE,
+    fetcher=None,
+    max_workers: int = 8,
+    rate: float = 10,
+    retries: int = 3,
+    backoff: float = 1,
+    max_age: timedelta = timedelta(days=7),
+    checkpoint_every: int = 50,
+) -> dict:
+    """Fetches the number of citations of the new and stale DOIs and stores
+    them in the citations file
+
+    Args:
+        dois (iterable): the DOIs, duplicates are fetched once
+        filename (str, optional): the citations file. Defaults to
+            CITATIONS_FILE.
+        fetcher (callable, optional): function returning the number of
+            citations of a DOI. Defaults to CrossrefFetcher().
+        max_workers (int, optional): number of concurrent lookups.
+            Defaults to 8.
+        rate (float, optional): maximum number of lookups per second, no limit
+            if None. Defaults to 10.
+        retries (int, optional): number of attempts per DOI. Defaults to 3.
+        backoff (float, optional): delay in seconds before the second attempt,
+            doubled at each attempt. Defaults to 1.
+        max_age (timedelta, optional): DOIs fetched more recently are not
+            fetched again. Defaults to 7 days.
+        checkpoint_every (int, optional): the file is saved every this many
+            lookups. Defaults to 50.
+
+    Returns:
+        dict: the content of the citations file
+    """
+    fetcher = fetcher or CrossrefFetcher()
+    limiter = RateLimiter(rate)
+    data = load_citations(filename)
+    to_fetch = stale_dois(sorted(set(dois)), data, max_age, datetime.now(timezone.utc))
+    logger.info(f"{len(to_fetch)} DOIs to fetch")
+
+    def fetch(doi):
+        for attempt in range(retries):
+            limiter.wait()
+            try:
+                return fetcher(doi)
+            except Exception as error:
+                if attempt == retries - 1:
+                    raise
+                logger.warning(f"{doi}: {error}, retrying")
+                time.sleep(backoff * 2**attempt)
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, doi): doi for doi in to_fetch}
+        for i, future in enumerate(as_completed(futures), start=1):
+            doi = futures[future]
+            try:
+                data["dois"][doi] = future.result()
+            except Exception as error:
+                # the previous number of citations is kept
+                logger.error(f"{doi}: {error}")
+                failed.append(doi)
+            else:
+                data["fetched"][doi] = datetime.now(timezone.utc).isoformat()
+            if i % checkpoint_every == 0:
+                save_citations(data, filename)
+                logger.info(f"{i}/{len(to_fetch)} DOIs fetched")
+
+    if not failed:
+        # otherwise, the next run fetches the failed DOIs and sets the date
+        data["date"] = str(date.today())
+    save_citations(data, filename)
+    logger.info(f"{len(to_fetch) - len(failed)} DOIs fetched, {len(failed)} failed")
+    return data
+
+
+def database_dois() -> list:
+    """Returns the DOIs of the properties of the HTM database with a source"""
+    return [prop.doi for prop in htm.database if prop.bibsource and prop.doi]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Refreshes the number of citations of the HTM database"
+    )
+    parser.add_argument("--output", default=CITATIONS_FILE)
+    parser.add_argument("--base-url", default=CROSSREF_URL)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=10, help="lookups per second")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--max-age", type=float, default=7, help="in days")
+    parser.add_argument("--checkpoint-every", type=int, default=50)
+    args = parser.parse_args()
 
-citations_data = {"date": str(date.today()), "dois": {}}
+    logging.basicConfig(level=logging.INFO)
+    refresh_citations(
+        database_dois(),
+        filename=args.output,
+        fetcher=CrossrefFetcher(args.base_url),
+        max_workers=args.workers,
+        rate=args.rate,
+        retries=args.retries,
+        max_age=timedelta(days=args.max_age),
+        checkpoint_every=args.checkpoint_every,
+    )
 
-for i, prop in enumerate(htm.database):
-    if prop.doi not in citations_data["dois"]:
-        citations_data["dois"][prop.doi] = prop.nb_citations
-        print(i)
 
-with open("htm_dashboard/citations.json", "w") as outfile:
-    json.dump(citations_data, outfile, indent=4)
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,34 @@
-import numpy as np
 import json
 import dash
-import plotly.io as pio
 
-from .export import generate_python_code
+from .export import generate_python_code, export_url
 
-from .tab import materials_options, TABLE_KEYS
+from .tab import (
+    make_materials_options,
+    make_authors_options,
+    EXPORT_LABELS,
+    DEFAULT_YEAR_BIN_WIDTH,
+)
+from .query import FilterQuery
+from .simplify import simplify_figure
+from .serialize import serialize_figure
+from .metrics import phase, record_cache_request
+from htm_dashboard import CURVE_TOLERANCE, CURVE_MIN_POINTS, SIGNIFICANT_DIGITS
+from htm_dashboard import CLIENTSIDE_PANELS
 
 from .graph import (
-    make_group_of_properties,
+    get_selection,
+    get_year_counts,
+    add_property_to_store,
+    refresh_database,
+    type_to_snapshot,
+    figure_cache,
     make_piechart_author,
     make_piechart_isotopes,
     make_piechart_materials,
+    make_panels_data,
     add_mean_value,
+    make_graph,
     make_figure_prop_per_year,
     make_citations_graph,
     TEMPLATE_DARK,
@@ -22,15 +38,6 @@ from .graph import (
 import h_transport_materials as htm
 
 
-type_to_database = {
-    "diffusivity": htm.diffusivities,
-    "solubility": htm.solubilities,
-    "permeability": htm.permeabilities,
-    "recombination_coeff": htm.recombination_coeffs,
-    "dissociation_coeff": htm.dissociation_coeffs,
-}
-
-
 def create_make_citations_figure_function(group):
     def make_citations_figure(
         figure,
@@ -40,15 +47,16 @@ def create_make_citations_figure_function(group):
         author_filter,
         year_filter,
     ):
-        properties_group = make_group_of_properties(
-            type_of_prop=group,
-            materials=material_filter,
-            authors=author_filter,
-            isotopes=isotope_filter,
-            years=year_filter,
+        query = FilterQuery.from_filters(
+            material_filter, author_filter, isotope_filter, year_filter
         )
+        selection = get_selection(group, query)
 
-        return make_citations_graph(properties_group, per_year=per_year)
+        with phase("figure"):
+            citations_figure = make_citations_graph(
+                selection.columns, selection.positions, per_year=per_year
+            )
+        return serialize_figure(citations_figure)
 
     return make_citations_figure
 
@@ -56,7 +64,7 @@ def create_make_citations_figure_function(group):
 def create_add_all_materials_function(group):
     def add_all_materials(n_clicks):
         if n_clicks:
-            return materials_options
+            return type_to_snapshot[group].facets.materials()
         else:
             return dash.no_update
 
@@ -66,9 +74,7 @@ def create_add_all_materials_function(group):
 def create_add_all_authors_function(group):
     def add_all_authors(n_clicks):
         if n_clicks:
-            return np.unique(
-                [prop.author.capitalize() for prop in type_to_database[group]]
-            ).tolist()
+            return type_to_snapshot[group].facets.authors()
         else:
             return dash.no_update
 
@@ -77,21 +83,69 @@ def create_add_all_authors_function(group):
 
 def create_update_entries_per_year_graph_function(group):
     def update_entries_per_year_graph(
-        figure, material_filter, isotope_filter, author_filter, year_filter
+        figure,
+        material_filter,
+        isotope_filter,
+        author_filter,
+        year_filter,
+        year_bin_width=DEFAULT_YEAR_BIN_WIDTH,
     ):
-        all_time_properties = make_group_of_properties(
-            type_of_prop=group,
-            materials=material_filter,
-            authors=author_filter,
-            isotopes=isotope_filter,
-        )
-        return make_figure_prop_per_year(
-            all_time_properties, step=5, selected_years=year_filter
+        query = FilterQuery.from_filters(
+            material_filter, author_filter, isotope_filter, year_filter
         )
+        # counted once per selection, any bin width is then read in O(bins)
+        year_counts = get_year_counts(group, query.without_years())
+        with phase("figure"):
+            per_year_figure = make_figure_prop_per_year(
+                year_counts, step=year_bin_width, selected_years=year_filter
+            )
+        return serialize_figure(per_year_figure)
 
     return update_entries_per_year_graph
 
 
+def make_main_graph(
+    group,
+    material_filter,
+    isotope_filter,
+    author_filter,
+    year_filter,
+    colour_by="property",
+    toggle_light=True,
+    mean=False,
+):
+    """Returns the main graph of a tab, from the figure cache if possible
+
+    Returns:
+        dict: the serialized figure
+    """
+    query = FilterQuery.from_filters(
+        material_filter, author_filter, isotope_filter, year_filter
+    )
+    selection = get_selection(group, query)
+    columns = selection.columns
+    key = (group, columns.fingerprint, query, colour_by, bool(toggle_light), mean)
+    figure = figure_cache.get(key)
+    record_cache_request("figure", hit=figure is not None)
+    if figure is not None:
+        return figure
+
+    with phase("figure"):
+        figure = make_graph(columns, selection.positions, colour_by=colour_by)
+        # not through pio.templates.default, shared by the threads
+        figure.update_layout(template=TEMPLATE_LIGHT if toggle_light else TEMPLATE_DARK)
+        if mean:
+            add_mean_value(columns, selection.positions, figure)
+        simplify_figure(
+            figure,
+            tolerance=CURVE_TOLERANCE,
+            min_points=CURVE_MIN_POINTS,
+            digits=SIGNIFICANT_DIGITS,
+        )
+
+    return figure_cache.set(key, figure)
+
+
 def create_update_graph_function(group):
     def update_graph(
         material_filter,
@@ -102,57 +156,29 @@ def create_update_graph_function(group):
         colour_by,
         toggle_light,
     ):
-        properties_group = make_group_of_properties(
-            type_of_prop=group,
-            materials=material_filter,
-            authors=author_filter,
-            isotopes=isotope_filter,
-            years=year_filter,
-        )
-
-        if toggle_light:
-            pio.templates.default = TEMPLATE_LIGHT
-        else:
-            pio.templates.default = TEMPLATE_DARK
-
-        figure = htm.plotting.plot_plotly(properties_group, colour_by=colour_by)
         changed_id = [p["prop_id"] for p in dash.callback_context.triggered][0]
-        if changed_id == f"mean_button_{group}.n_clicks":
-            add_mean_value(properties_group, figure)
-
-        return figure
+        return make_main_graph(
+            group,
+            material_filter,
+            isotope_filter,
+            author_filter,
+            year_filter,
+            colour_by=colour_by,
+            toggle_light=toggle_light,
+            mean=changed_id == f"mean_button_{group}.n_clicks",
+        )
 
     return update_graph
 
 
-def create_make_download_data_function(group):
-    def make_download_data(
-        n_clicks,
-        material_filter,
-        isotope_filter,
-        author_filter,
-        year_filter,
-    ):
-        changed_id = [p["prop_id"] for p in dash.callback_context.triggered][0]
-        if changed_id == f"extract_button_{group}.n_clicks":
-            properties_group = make_group_of_properties(
-                type_of_prop=group,
-                materials=material_filter,
-                authors=author_filter,
-                isotopes=isotope_filter,
-                years=year_filter,
-            )
-            data = {"data": []}
-            for prop in properties_group:
-                data["data"].append(prop.to_json())
-
-            data["htm_version"] = htm.__version__
-            return dict(
-                content=json.dumps(data, indent=2),
-                filename="data.json",
-            )
+def create_update_export_link_function(group):
+    def update_export_link(material_filter, isotope_filter, author_filter, year_filter):
+        query = FilterQuery.from_filters(
+            material_filter, author_filter, isotope_filter, year_filter
+        )
+        return [export_url(group, query, fmt) for fmt in EXPORT_LABELS]
 
-    return make_download_data
+    return update_export_link
 
 
 def make_download_python_callback(group):
@@ -165,15 +191,11 @@ def make_download_python_callback(group):
     ):
         changed_id = [p["prop_id"] for p in dash.callback_context.triggered][0]
         if changed_id == f"python_button_{group}.n_clicks":
+            query = FilterQuery.from_filters(
+                material_filter, author_filter, isotope_filter, year_filter
+            )
             return dict(
-                content=generate_python_code(
-                    materials=material_filter,
-                    isotopes=isotope_filter,
-                    authors=author_filter,
-                    yearmin=year_filter[0],
-                    yearmax=year_filter[1],
-                    group=group,
-                ),
+                content=generate_python_code(query, group=group),
                 filename="script.py",
             )
 
@@ -236,46 +258,27 @@ def make_add_property(group):
             if (new_range_low, new_range_high) == (None, None):
                 (new_range_low, new_range_high) = (300, 1200)
 
-            if group == "diffusivity":
-                new_property = htm.Diffusivity(
-                    D_0=new_pre_exp,
-                    E_D=new_act_energy,
-                )
-            elif group == "solubility":
-                new_property = htm.Solubility(
-                    S_0=new_pre_exp,
-                    E_S=new_act_energy,
-                    law=new_sol_law,
-                )
-            elif group == "recombination_coeff":
-                new_property = htm.RecombinationCoeff(
-                    pre_exp=new_pre_exp,
-                    act_energy=new_act_energy,
-                )
+            add_property_to_store(
+                group,
+                {
+                    "pre_exp": new_pre_exp,
+                    "act_energy": new_act_energy,
+                    "author": new_author,
+                    "year": new_year,
+                    "isotope": new_isotope,
+                    "material": new_material,
+                    "range": [new_range_low, new_range_high],
+                    "law": new_sol_law,
+                },
+            )
 
-            new_property.author = new_author.lower()
-            new_property.year = new_year
-            new_property.isotope = new_isotope
-            # TODO find a way to find potentially already existing material (like tungsten)
-            new_property.material = htm.Material(name=new_material)
-            new_property.range = (new_range_low, new_range_high)
-
-            type_to_database[group].append(new_property)
-
-        all_authors = np.unique(
-            [
-                prop.author.capitalize()
-                for prop in type_to_database[group]
-                if prop.material in material_filter
-            ]
-        ).tolist()
-        all_materials = [prop.material.name.lower() for prop in type_to_database[group]]
-        all_families = [
-            p.family for prop in type_to_database[group] for p in prop.material.parents
-        ]
-        all_materials = np.unique(all_materials + all_families).tolist()
-
-        return all_materials, all_authors, ""
+        # the options include the properties added by the other workers
+        refresh_database(group)
+        return (
+            make_materials_options(group),
+            make_authors_options(group, material_filter),
+            "",
+        )
 
     return add_property
 
@@ -288,14 +291,14 @@ def create_update_piechart_material_function(group):
         author_filter,
         year_filter,
     ):
-        properties_group = make_group_of_properties(
-            type_of_prop=group,
-            materials=material_filter,
-            authors=author_filter,
-            isotopes=isotope_filter,
-            years=year_filter,
+        query = FilterQuery.from_filters(
+            material_filter, author_filter, isotope_filter, year_filter
         )
-        return make_piechart_materials(properties_group)
+        selection = get_selection(group, query)
+        columns = selection.columns
+        with phase("figure"):
+            figure = make_piechart_materials(columns, selection.positions)
+        return serialize_figure(figure)
 
     return update_piechart_material
 
@@ -308,14 +311,14 @@ def create_update_piechart_isotopes_function(group):
         author_filter,
         year_filter,
     ):
-        properties_group = make_group_of_properties(
-            type_of_prop=group,
-            materials=material_filter,
-            authors=author_filter,
-            isotopes=isotope_filter,
-            years=year_filter,
+        query = FilterQuery.from_filters(
+            material_filter, author_filter, isotope_filter, year_filter
         )
-        return make_piechart_isotopes(properties_group)
+        selection = get_selection(group, query)
+        columns = selection.columns
+        with phase("figure"):
+            figure = make_piechart_isotopes(columns, selection.positions)
+        return serialize_figure(figure)
 
     return update_piechart_isotope
 
@@ -328,61 +331,141 @@ def create_update_piechart_authors_function(group):
         author_filter,
         year_filter,
     ):
-        properties_group = make_group_of_properties(
-            type_of_prop=group,
-            materials=material_filter,
-            authors=author_filter,
-            isotopes=isotope_filter,
-            years=year_filter,
+        query = FilterQuery.from_filters(
+            material_filter, author_filter, isotope_filter, year_filter
         )
-        return make_piechart_author(properties_group)
+        selection = get_selection(group, query)
+        columns = selection.columns
+        with phase("figure"):
+            figure = make_piechart_author(columns, selection.positions)
+        return serialize_figure(figure)
 
     return update_piechart_author
 
 
+def create_update_panels_data_function(group):
+    """Returns a callback returning the data of the pie charts and of the per
+    year histogram of a tab, computed in the browser"""
+
+    def update_panels_data(
+        material_filter,
+        isotope_filter,
+        author_filter,
+        year_filter,
+    ):
+        query = FilterQuery.from_filters(
+            material_filter, author_filter, isotope_filter, year_filter
+        )
+        # the histogram shows all the years, the pie charts the selected ones
+        selection = get_selection(group, query.without_years())
+        with phase("figure"):
+            return make_panels_data(
+                selection.columns, selection.positions, selected_years=year_filter
+            )
+
+    return update_panels_data
+
+
 def create_update_table_data_function(group):
+    """Returns a callback returning the visible page of the table, sorted and
+    paged on the server. The table is only updated when its sub-tab is open.
+    The filters of the rows shown are kept in the browser so that the table
+    goes back to its first page only when the filters changed.
+    """
+
     def update_table_data(
-        figure, material_filter, isotope_filter, author_filter, year_filter
+        active_subtab,
+        page_current,
+        page_size,
+        sort_by,
+        material_filter,
+        isotope_filter,
+        author_filter,
+        year_filter,
+        table_filters,
     ):
-        data = []
-
-        properties_group = make_group_of_properties(
-            type_of_prop=group,
-            materials=material_filter,
-            authors=author_filter,
-            isotopes=isotope_filter,
-            years=year_filter,
-        )
+        if active_subtab != "table":
+            return (dash.no_update,) * 4
+
+        filters = [material_filter, author_filter, isotope_filter, year_filter]
+        query = FilterQuery.from_filters(*filters)
+        if table_filters is None or FilterQuery.from_filters(*table_filters) != query:
+            # the filters changed since the table was last updated
+            page_current = 0
+
+        selection = get_selection(group, query)
+        positions, columns = selection.positions, selection.columns
+        with phase("table"):
+            if sort_by:
+                positions = columns.sort_positions(
+                    positions,
+                    sort_by[0]["column_id"],
+                    descending=sort_by[0]["direction"] == "desc",
+                )
 
-        for prop in properties_group:
-            entry = {}
-            for key in TABLE_KEYS:
-                if hasattr(prop, key):
-                    val = getattr(prop, key)
-                    if key == "range":
-                        if val is None:
-                            val = "none"
-                        else:
-                            val = f"{val[0]:.0f~P}-{val[1]:.0f~P}"
-                    elif key == "material":
-                        val = f"{val.name}"
-                    elif key == "pre_exp":
-                        val = f"{val: .2e~P}"
-                    elif key == "act_energy":
-                        val = f"{val:.2f~P}"
-                    elif key == "doi":
-                        entry[key] = prop.source
-                        if prop.bibsource:
-                            if prop.doi:
-                                clickable_doi = (
-                                    f"[{prop.doi}](https://doi.org/{prop.doi})"
-                                )
-                                val = clickable_doi
-
-                entry[key] = val
-
-            data.append(entry)
-
-        return data
+            page_count = max(1, -(-len(positions) // page_size))
+            page_current = min(page_current or 0, page_count - 1)
+            start = page_current * page_size
+            rows = columns.table_rows(positions[start : start + page_size])
+        return rows, page_count, page_current, filters
 
     return update_table_data
+
+
+def create_update_tab_function(group):
+    """Returns a callback updating the graph, the citations graph and either
+    the data of the panels computed in the browser or the per year histogram
+    and the three pie charts of a tab, at once.
+    The database is filtered once and shared through the filter cache.
+    """
+    update_graph = create_update_graph_function(group)
+    make_citations_figure = create_make_citations_figure_function(group)
+    update_entries_per_year_graph = create_update_entries_per_year_graph_function(
+        group
+    )
+    update_piechart_material = create_update_piechart_material_function(group)
+    update_piechart_isotope = create_update_piechart_isotopes_function(group)
+    update_piechart_author = create_update_piechart_authors_function(group)
+    update_panels_data = create_update_panels_data_function(group)
+
+    def update_tab(
+        material_filter,
+        isotope_filter,
+        author_filter,
+        year_filter,
+        mean_button,
+        colour_by,
+        toggle_light,
+        per_year,
+        year_bin_width=DEFAULT_YEAR_BIN_WIDTH,
+    ):
+        filters = (material_filter, isotope_filter, author_filter, year_filter)
+        nb_panels = 1 if CLIENTSIDE_PANELS else 4
+
+        changed_id = [p["prop_id"] for p in dash.callback_context.triggered][0]
+        if changed_id == f"year_bin_width_{group}.value":
+            # only the histogram depends on the width of its bins
+            histogram = update_entries_per_year_graph(None, *filters, year_bin_width)
+            return (dash.no_update,) * 2 + (histogram,) + (dash.no_update,) * 3
+
+        citations_figure = make_citations_figure(None, per_year, *filters)
+        if changed_id == f"per_year_citations_{group}.on":
+            # only the citations graph depends on this switch
+            return (dash.no_update, citations_figure) + (dash.no_update,) * nb_panels
+
+        if CLIENTSIDE_PANELS:
+            panels = (update_panels_data(*filters),)
+        else:
+            panels = (
+                update_entries_per_year_graph(None, *filters, year_bin_width),
+                update_piechart_material(None, *filters),
+                update_piechart_isotope(None, *filters),
+                update_piechart_author(None, *filters),
+            )
+        return (
+            update_graph(*filters, mean_button, colour_by, toggle_light),
+            citations_figure,
+            *panels,
+        )
+
+    return update_tab
@@ -0,0 +1,103 @@
+from pathlib import Path
+from datetime import datetime
+import json
+import os
+import threading
+
+import numpy as np
+
+from .cache import LRUCache
+
+CITATIONS_FILE = Path(__file__).parent / "citations.json"
+
+
+class CitationStore:
+    """Number of citations of each DOI, loaded from the citations file.
+    The file is only read again when its modification time changes.
+
+    The citations of the properties of the columnar snapshots are cached by
+    fingerprint, the arrays of the replaced snapshots being evicted.
+
+    Args:
+        filename (str, optional): path of the citations file.
+            Defaults to CITATIONS_FILE.
+        maxsize (int, optional): maximum number of cached arrays.
+            Defaults to 32.
+    """
+
+    def __init__(self, filename=CITATIONS_FILE, maxsize: int = 32):
+        self.filename = filename
+        self._mtime = None
+        self._data = {"date": None, "dois": {}}
+        self._arrays = LRUCache(maxsize)
+        self._lock = threading.Lock()
+
+    def _load_if_changed(self):
+        mtime = os.stat(self.filename).st_mtime
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            with open(self.filename) as f:
+                self._data = json.load(f)
+            self._arrays = LRUCache(self._arrays.maxsize)
+            self._mtime = mtime
+
+    @property
+    def date(self) -> str:
+        """the date of the last refresh of the citations file"""
+        self._load_if_changed()
+        return self._data["date"]
+
+    @property
+    def dois(self) -> dict:
+        """the number of citations of each DOI"""
+        self._load_if_changed()
+        return self._data["dois"]
+
+    def nb_citations(self, prop) -> int:
+        """Returns the number of citations of a property, from the citations
+        file if its DOI is known, from Crossref otherwise
+
+        Args:
+            prop (htm.Property): the property
+
+        Returns:
+            int: the number of citations
+        """
+        dois = self.dois
+        if prop.doi in dois:
+            return dois[prop.doi]
+        return prop.nb_citations
+
+    def citations(self, columns, per_year=False) -> np.ndarray:
+        """Returns the number of citations of each property of a columnar
+        snapshot, aligned with its positions
+
+        Args:
+            columns (PropertyColumns): the columnar snapshot of a database
+            per_year (bool, optional): if True, the number of citations is
+                divided by the number of years since the publication.
+                Defaults to False.
+
+        Returns:
+            np.ndarray: the number of citations
+        """
+        self._load_if_changed()
+        current_year = datetime.now().year
+        # the fingerprint covers the DOIs and the years of the properties
+        key = (columns.fingerprint, per_year, current_year)
+        nb_citations = self._arrays.get(key)
+        if nb_citations is None:
+            props = columns.database[: columns.size]
+            nb_citations = np.array(
+                [self.nb_citations(prop) for prop in props], dtype=float
+            )
+            if per_year:
+                nb_citations /= current_year - columns.year + 1
+            self._arrays.set(key, nb_citations)
+        return nb_citations
+
+
+citation_store = CitationStore()
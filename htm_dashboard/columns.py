@@ -0,0 +1,334 @@
+import copy
+import hashlib
+import numpy as np
+import pandas as pd
+import h_transport_materials as htm
+from h_transport_materials.property import DEFAULT_ENERGY_UNITS
+
+ACT_ENERGY_UNITS = f"{DEFAULT_ENERGY_UNITS:~P}"
+
+
+def _encode(values):
+    """Returns the sorted unique labels of values and the code of each value"""
+    labels, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+    return labels, codes.astype(int)
+
+
+def make_label(prop) -> str:
+    """Returns the name of the trace of a property"""
+    return f"{prop.isotope} {prop.author.capitalize()} ({prop.year})"
+
+
+def make_reference(prop) -> str:
+    """Returns the label of the reference of a property in the citations graph"""
+    return f"{prop.author.capitalize()} ({prop.year})"
+
+
+def make_hovertemplate(prop):
+    # TODO refactor this
+    if isinstance(prop, htm.Solubility):
+        return (
+            "<b>%{text}</b><br><br>"
+            + prop.material.name
+            + "<br>"
+            + "1/T: %{x:,.2e} K<sup>-1</sup><br>"
+            + "T: %{customdata:.0f} K<br>"
+            + "S: %{y:,.2e} "
+            + f"{prop.units:~H}<br>"
+            + f"S_0: {prop.pre_exp:.2e~H} <br>"
+            + f"E_S : {prop.act_energy:.2f~H}"
+            + "<extra></extra>"
+        )
+    elif isinstance(prop, htm.Diffusivity):
+        return (
+            "<b>%{text}</b><br><br>"
+            + prop.material.name
+            + "<br>"
+            + "1/T: %{x:,.2e} K<sup>-1</sup><br>"
+            + "T: %{customdata:.0f} K<br>"
+            + "D: %{y:,.2e} "
+            + f"{prop.units:~H} <br>"
+            + f"D_0: {prop.pre_exp:.2e~H}<br>"
+            + f"E_D : {prop.act_energy:.2f~H}"
+            + "<extra></extra>"
+        )
+    else:
+        return (
+            "<b>%{text}</b><br><br>"
+            + prop.material.name
+            + "<br>"
+            + "1/T: %{x:,.2e} K<sup>-1</sup><br>"
+            + "T: %{customdata:.0f} K<br>"
+            + "value: %{y:,.2e} "
+            + f"{prop.units:~H} <br>"
+            + f"pre-exp: {prop.pre_exp:.2e~H}<br>"
+            + f"act. energy : {prop.act_energy:.2f~H}"
+            + "<extra></extra>"
+        )
+
+
+class PropertyColumns:
+    """Columnar snapshot of a database of properties.
+    Magnitudes are stored in the units of the properties: pre-exponential factors
+    in the units given by units_codes, activation energies in eV/particle and
+    temperature ranges in K.
+
+    Args:
+        database (htm.PropertiesGroup): the database, which must not be
+            modified. See copy_with to add properties.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.size = 0
+        self._units_strings = {}
+        self._props = []
+        self._sort_keys = {}
+        self.labels = []
+        self.hovertemplates = []
+        self._rows = []
+        self._build()
+
+    def _build(self):
+        props = list(self.database)
+        nan = float("nan")
+
+        self.pre_exp = np.array([prop.pre_exp.magnitude for prop in props], float)
+        self.act_energy = np.array(
+            [prop.act_energy.magnitude for prop in props], float
+        )
+        ranges = [prop.range for prop in props]
+        self.range_low = np.array(
+            [nan if r is None else r[0].magnitude for r in ranges], float
+        )
+        self.range_high = np.array(
+            [nan if r is None else r[1].magnitude for r in ranges], float
+        )
+        self.year = np.array(
+            [nan if prop.year is None else prop.year for prop in props], float
+        )
+
+        self.materials, self.material_codes = _encode(
+            [prop.material.name for prop in props]
+        )
+        self.authors, self.author_codes = _encode([prop.author for prop in props])
+        self.isotopes, self.isotope_codes = _encode(
+            [prop.isotope or "" for prop in props]
+        )
+        # the references of the citations graphs
+        self.references, self.reference_codes = _encode(
+            [make_reference(prop) for prop in props]
+        )
+
+        self.units = []
+        units_codes = []
+        for prop in props:
+            if prop.units not in self.units:
+                self.units.append(prop.units)
+            units_codes.append(self.units.index(prop.units))
+        self.units_codes = np.array(units_codes, dtype=int)
+        self._units_strings = {}
+
+        self.notes = np.array([prop.note for prop in props], dtype=object)
+        self.dois = np.array([prop.doi for prop in props], dtype=object)
+        self.has_bibsource = np.array(
+            [prop.bibsource is not None for prop in props], dtype=bool
+        )
+        self.size = len(props)
+        self._sort_keys = {}
+        self._format(props)
+        self.fingerprint = self._fingerprint()
+
+    def _format(self, props):
+        # formatting with pint is slow: the strings of the properties already
+        # formatted are kept when the new properties were appended
+        kept = 0
+        for old_prop, prop in zip(self._props, props):
+            if old_prop is not prop:
+                break
+            kept += 1
+        new_props = props[kept:]
+        self.labels = self.labels[:kept] + [make_label(prop) for prop in new_props]
+        self.hovertemplates = self.hovertemplates[:kept] + [
+            make_hovertemplate(prop) for prop in new_props
+        ]
+        units = self.units_strings("~P")
+        self._rows = self._rows[:kept] + [
+            self._make_row(i, units[self.units_codes[i]])
+            for i in range(kept, len(props))
+        ]
+        self._props = props
+
+    def _fingerprint(self) -> str:
+        """Returns a digest of the content of the snapshot, identical in all
+        the processes holding the same properties"""
+        digest = hashlib.sha1()
+        for array in [
+            self.pre_exp,
+            self.act_energy,
+            self.range_low,
+            self.range_high,
+            self.year,
+            self.material_codes,
+            self.author_codes,
+            self.isotope_codes,
+            self.units_codes,
+        ]:
+            digest.update(array.tobytes())
+        for labels in [self.materials, self.authors, self.isotopes, self.units]:
+            digest.update(repr([str(label) for label in labels]).encode())
+        digest.update(repr(self.dois.tolist()).encode())
+        return digest.hexdigest()
+
+    def copy_with(self, database):
+        """Returns the snapshot of a database extending the database of this
+        snapshot, which is left unchanged. The strings formatted for the
+        existing properties are reused.
+
+        Args:
+            database (htm.PropertiesGroup): the extended database
+
+        Returns:
+            PropertyColumns: the new snapshot
+        """
+        columns = copy.copy(self)
+        columns.database = database
+        columns._build()
+        return columns
+
+    def units_strings(self, fmt: str = "~P") -> np.ndarray:
+        """Returns the formatted pre-exponential factor units, in the order of
+        the units table
+
+        Args:
+            fmt (str, optional): pint format specification. Defaults to "~P".
+
+        Returns:
+            np.ndarray: the formatted units
+        """
+        if fmt not in self._units_strings:
+            self._units_strings[fmt] = np.array(
+                [f"{units:{fmt}}" for units in self.units], dtype=object
+            )
+        return self._units_strings[fmt]
+
+    def group(self, positions) -> htm.PropertiesGroup:
+        """Returns the properties at the given positions"""
+        return htm.PropertiesGroup(self.database[i] for i in positions)
+
+    def counts(self, codes: np.ndarray, positions) -> np.ndarray:
+        """Counts the occurrences of each code at the given positions
+
+        Args:
+            codes (np.ndarray): one of material_codes, author_codes, isotope_codes
+            positions (np.ndarray): the selected positions
+
+        Returns:
+            np.ndarray: the number of selected properties for each label
+        """
+        return np.bincount(codes[positions], minlength=codes.max(initial=-1) + 1)
+
+    def table_rows(self, positions) -> list:
+        """Returns the rows of the properties table at the given positions.
+        The rows are formatted once per property and shared: they must not be
+        modified.
+
+        Args:
+            positions (np.ndarray): the selected positions
+
+        Returns:
+            list: list of dicts with the keys of tab.TABLE_KEYS
+        """
+        return [self._rows[i] for i in positions]
+
+    def sort_positions(self, positions, column: str, descending=False):
+        """Sorts positions by the values of a column of the table. Numbers
+        are sorted by value, the other columns alphabetically.
+
+        Args:
+            positions (np.ndarray): the positions to sort
+            column (str): one of the keys of tab.TABLE_KEYS
+            descending (bool, optional): if True, sorts in descending order.
+                Defaults to False.
+
+        Returns:
+            np.ndarray: the sorted positions
+        """
+        if column not in self._sort_keys:
+            self._sort_keys[column] = self._make_sort_key(column)
+        key = self._sort_keys[column][positions]
+        if descending:
+            key = -key
+        # missing values (nan) are last in both orders
+        return np.asarray(positions)[np.argsort(key, kind="stable")]
+
+    def _make_sort_key(self, column: str) -> np.ndarray:
+        numbers = {
+            "pre_exp": self.pre_exp,
+            "act_energy": self.act_energy,
+            "range": self.range_low,
+        }
+        if column in numbers:
+            return numbers[column]
+        if column == "material":
+            # labels are sorted, so are their codes
+            return self.material_codes.astype(float)
+        if column == "isotope":
+            return self.isotope_codes.astype(float)
+        values = [row[column] or "" for row in self._rows]
+        values = np.char.lower(np.array(values, dtype=str))
+        return np.unique(values, return_inverse=True)[1].astype(float)
+
+    def _make_row(self, i, unit) -> dict:
+        if np.isnan(self.range_low[i]):
+            range_ = "none"
+        else:
+            range_ = f"{self.range_low[i]:.0f} K-{self.range_high[i]:.0f} K"
+        doi = self.dois[i]
+        if self.has_bibsource[i] and doi:
+            doi = f"[{doi}](https://doi.org/{doi})"
+        return {
+            "material": str(self.materials[self.material_codes[i]]),
+            "isotope": str(self.isotopes[self.isotope_codes[i]]),
+            "pre_exp": f"{self.pre_exp[i]: .2e} {unit}",
+            "act_energy": f"{self.act_energy[i]:.2f} {ACT_ENERGY_UNITS}",
+            "range": range_,
+            "author": str(self.authors[self.author_codes[i]]),
+            "note": self.notes[i],
+            "doi": doi,
+        }
+
+    def to_frame(self, positions) -> pd.DataFrame:
+        """Returns the properties at the given positions as a data frame with
+        one row per property. Units are written in the default pint format so
+        that they can be parsed back with htm.ureg.
+
+        Args:
+            positions (np.ndarray): the selected positions
+
+        Returns:
+            pd.DataFrame: the material, isotope, author, year, pre_exp,
+                pre_exp_units, act_energy, act_energy_units, range_low,
+                range_high and doi columns
+        """
+
+        def categorical(codes, labels):
+            return pd.Categorical.from_codes(codes[positions], categories=labels)
+
+        return pd.DataFrame(
+            {
+                "material": categorical(self.material_codes, self.materials),
+                "isotope": categorical(self.isotope_codes, self.isotopes),
+                "author": categorical(self.author_codes, self.authors),
+                "year": pd.array(self.year[positions], dtype="Int64"),
+                "pre_exp": self.pre_exp[positions],
+                "pre_exp_units": categorical(
+                    self.units_codes, self.units_strings("")
+                ),
+                "act_energy": self.act_energy[positions],
+                "act_energy_units": str(DEFAULT_ENERGY_UNITS),
+                "range_low": self.range_low[positions],
+                "range_high": self.range_high[positions],
+                "doi": self.dois[positions],
+            }
+        )
@@ -1,6 +1,13 @@
 import h_transport_materials as htm
+import io
 import json
+import zlib
+from urllib.parse import urlencode
 from jinja2 import Template
+import flask
+
+from .graph import get_selection, type_to_index
+from .query import FilterQuery
 
 
 type_to_database = {
@@ -21,7 +28,9 @@ filtered_{{group}} = (
     {{database}}.filter(material={{materials}})
     .filter(author={{authors}})
     .filter(isotope={{isotopes}})
-    .filter(year=np.arange({{yearmin}}, {{yearmax}}, step=1).tolist())
+{%- if years %}
+    .filter(year=np.arange({{years[0]}}, {{years[1] + 1}}, step=1).tolist())
+{%- endif %}
 )
 
 htm.plotting.plot(filtered_{{group}})
@@ -35,14 +44,215 @@ plt.show()
 )
 
 
-def generate_python_code(materials, authors, isotopes, yearmin, yearmax, group):
+def generate_python_code(query, group):
+    """Returns a python script reproducing the filtering of a tab with htm
+
+    Args:
+        query (FilterQuery): the normalized filters
+        group (str): the group of properties (eg. "diffusivity")
+
+    Returns:
+        str: the python script
+    """
+    filters = query.to_dict()
     python_code = python_template.render(
         group=group,
         database=type_to_database[group],
-        materials=[mat.lower() for mat in materials],
-        authors=[author.lower() for author in authors],
-        isotopes=[iso.lower() for iso in isotopes],
-        yearmin="{}".format(yearmin),
-        yearmax="{}".format(yearmax),
+        materials=filters["materials"],
+        authors=filters["authors"],
+        isotopes=filters["isotopes"],
+        years=filters["years"],
     )
     return python_code
+
+
+EXPORT_ROUTE = "/export/<group>.<fmt>"
+
+# mimetype of each export format
+EXPORT_FORMATS = {
+    "json": "application/json",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+
+def iter_json_export(properties_group, query, indent=2):
+    """Yields the JSON export of a group of properties chunk by chunk, one
+    property at a time, so that the whole file is never held in memory
+
+    Args:
+        properties_group (list): the properties to export
+        query (FilterQuery): the filters used to select the properties
+        indent (int, optional): the indentation of the JSON file, None for a
+            compact file. Defaults to 2.
+
+    Yields:
+        str: the chunks of the JSON file
+    """
+    if indent is None:
+        newline, separator, colon = "", "", ":"
+        item_separators = (",", ":")
+    else:
+        newline, separator, colon = "\n", " " * indent, ": "
+        item_separators = None
+
+    def dump(value, depth):
+        text = json.dumps(value, indent=indent, separators=item_separators)
+        return text.replace("\n", "\n" + separator * depth)
+
+    yield "{" + newline + separator + '"data"' + colon + "["
+    for i, prop in enumerate(properties_group):
+        yield ("," if i else "") + newline + separator * 2 + dump(prop.to_json(), 2)
+    if len(properties_group) > 0:
+        yield newline + separator
+    yield "],"
+    yield newline + separator + '"filters"' + colon + dump(query.to_dict(), 1) + ","
+    yield newline + separator + '"htm_version"' + colon + json.dumps(htm.__version__)
+    yield newline + "}"
+
+
+def iter_columnar_export(columns, positions, fmt, chunk_size=1000):
+    """Yields the CSV, Parquet or Arrow IPC export of the properties at the
+    given positions, built from the columnar snapshot
+
+    Args:
+        columns (PropertyColumns): the columnar snapshot of the database
+        positions (np.ndarray): the selected positions
+        fmt (str): "csv", "parquet" or "arrow"
+        chunk_size (int, optional): number of CSV rows per chunk.
+            Defaults to 1000.
+
+    Yields:
+        str or bytes: the chunks of the file
+    """
+    frame = columns.to_frame(positions)
+    if fmt == "csv":
+        for start in range(0, max(len(frame), 1), chunk_size):
+            chunk = frame.iloc[start : start + chunk_size]
+            yield chunk.to_csv(index=False, header=start == 0)
+        return
+
+    # pyarrow is only loaded by the workers serving these formats
+    import pyarrow as pa
+
+    buffer = io.BytesIO()
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, buffer)
+    else:
+        with pa.ipc.new_file(buffer, table.schema) as writer:
+            writer.write_table(table)
+    yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Compresses a stream of chunks in the gzip format
+
+    Args:
+        chunks (iterable): the str or bytes chunks
+
+    Yields:
+        bytes: the compressed chunks
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_url(group, query, fmt="json", indent=2, gzip=False):
+    """Returns the URL of the export of the properties matching a query
+
+    Args:
+        group (str): the group of properties (eg. "diffusivity")
+        query (FilterQuery): the filters
+        fmt (str, optional): one of EXPORT_FORMATS. Defaults to "json".
+        indent (int, optional): the indentation of the JSON file, None for a
+            compact file. Ignored by the other formats. Defaults to 2.
+        gzip (bool, optional): if True, the file is gzip compressed.
+            Defaults to False.
+
+    Returns:
+        str: the URL
+    """
+    index = type_to_index[group]
+    params = []
+    for field, values in [
+        ("material", query.materials),
+        ("author", query.authors),
+        ("isotope", query.isotopes),
+    ]:
+        # keeps the URL short when all the values are selected
+        if len(values) > 0 and index.covers(field, values):
+            continue
+        params += [(field, value) for value in values] or [(field, "")]
+    if query.years is not None:
+        params += [("year_min", query.years[0]), ("year_max", query.years[1])]
+    if indent is None:
+        params.append(("compact", 1))
+    elif indent != 2:
+        params.append(("indent", indent))
+    if gzip:
+        params.append(("gzip", 1))
+    url = EXPORT_ROUTE.replace("<group>", group).replace("<fmt>", fmt)
+    if params:
+        url += "?" + urlencode(params)
+    return url
+
+
+def make_export_response(group, fmt):
+    """Flask view streaming the export of the properties matching the
+    filters of the request arguments (see export_url). A missing filter
+    selects all the values, an empty one selects nothing. The years are
+    given by two integers, year_min and year_max, or not at all."""
+    if group not in type_to_database or fmt not in EXPORT_FORMATS:
+        flask.abort(404)
+    args = flask.request.args
+    years = None
+    if "year_min" in args or "year_max" in args:
+        years = [args.get("year_min", type=int), args.get("year_max", type=int)]
+        if None in years:
+            # a single bound or a bound which isn't a year
+            flask.abort(400)
+    # a missing filter selects all the values
+    index = type_to_index[group]
+    filters = [
+        [value for value in args.getlist(field) if value]
+        if field in args
+        else index.keys(field)
+        for field in ["material", "author", "isotope"]
+    ]
+    query = FilterQuery.from_filters(*filters, years)
+    selection = get_selection(group, query)
+    if fmt == "json":
+        indent = args.get("indent", 2, type=int)
+        if args.get("compact") == "1":
+            indent = None
+        chunks = iter_json_export(selection.group, query, indent)
+    else:
+        chunks = iter_columnar_export(selection.columns, selection.positions, fmt)
+
+    filename = f"data.{fmt}"
+    if args.get("gzip") == "1":
+        filename += ".gz"
+        response = flask.Response(gzip_chunks(chunks), mimetype="application/gzip")
+    else:
+        response = flask.Response(chunks, mimetype=EXPORT_FORMATS[fmt])
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+def register_export_route(server):
+    """Adds the streaming export endpoint to the Flask server of the app
+
+    Args:
+        server (flask.Flask): the server
+    """
+    server.add_url_rule(EXPORT_ROUTE, "export", make_export_response)
@@ -0,0 +1,135 @@
+import copy
+
+
+def material_facets(material) -> set:
+    """Returns the name of a material and the families of its parents"""
+    return {material.name} | {parent.family for parent in material.parents}
+
+
+class FacetIndex:
+    """Facets of a database of properties: the positions of the properties
+    of each author for each material name and family, from which the options
+    of the filters and their counts are read without scanning the database.
+
+    Args:
+        database (htm.PropertiesGroup): the database to index, which must not
+            be modified. See copy_with to index appended properties.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.size = 0
+        self._names = {}
+        self._families = {}
+        # {material name or family: {capitalized author: (positions)}}
+        self._authors = {}
+        self._add(database)
+
+    def _add(self, props):
+        for prop in props:
+            i = self.size
+            self.size += 1
+            material = prop.material
+            if isinstance(material, str):
+                continue
+            keys = material_facets(material)
+            self._names[material.name] = self._names.get(material.name, 0) + 1
+            for family in keys - {material.name}:
+                self._families[family] = self._families.get(family, 0) + 1
+            if not isinstance(prop.author, str):
+                continue
+            author = prop.author.capitalize()
+            for key in keys:
+                authors = self._authors.setdefault(key, {})
+                authors[author] = authors.get(author, ()) + (i,)
+
+    def copy_with(self, database):
+        """Returns the facets of a database made of the properties of this one
+        followed by new properties. The facets of the materials without new
+        properties are shared with this index, which is left unchanged.
+
+        Args:
+            database (htm.PropertiesGroup): the new database
+
+        Returns:
+            FacetIndex: the facets of the new database
+        """
+        new = copy.copy(self)
+        new.database = database
+        new._names = dict(self._names)
+        new._families = dict(self._families)
+        new._authors = dict(self._authors)
+        new_props = database[self.size :]
+        for prop in new_props:
+            if isinstance(prop.material, str):
+                continue
+            for key in material_facets(prop.material):
+                if key in self._authors and new._authors[key] is self._authors[key]:
+                    # the positions are tuples, only the dict is copied
+                    new._authors[key] = dict(self._authors[key])
+        new._add(new_props)
+        return new
+
+    def materials(self) -> list:
+        """Returns the sorted material names followed by the sorted families"""
+        return sorted(self._names) + sorted(self._families)
+
+    def material_counts(self) -> dict:
+        """Returns the number of properties of each material name and family,
+        in the order of materials()"""
+        counts = {name: self._names[name] for name in sorted(self._names)}
+        for family in sorted(self._families):
+            counts[family] = self._families[family]
+        return counts
+
+    def author_counts(self, materials=None) -> dict:
+        """Returns the number of properties of each author for some materials
+
+        Args:
+            materials (list, optional): material names or families, all the
+                materials if None. Defaults to None.
+
+        Returns:
+            dict: the capitalized authors (sorted) and their number of
+                properties, a property of several of the materials (eg. a
+                material and its family) being counted once
+        """
+        if materials is None:
+            # each property has a single material name
+            materials = list(self._names)
+        authors = {}
+        for material in materials:
+            for author, positions in self._authors.get(material, {}).items():
+                authors.setdefault(author, []).append(positions)
+        counts = {}
+        for author in sorted(authors):
+            positions = authors[author]
+            if len(positions) == 1:
+                counts[author] = len(positions[0])
+            else:
+                counts[author] = len(set().union(*positions))
+        return counts
+
+    def authors(self, materials=None) -> list:
+        """Returns the sorted capitalized authors of the properties of some
+        materials, all the materials if None"""
+        return list(self.author_counts(materials))
+
+
+def make_options(counts: dict, show_counts: bool = False) -> list:
+    """Returns the options of a dropdown
+
+    Args:
+        counts (dict): the number of properties of each value
+        show_counts (bool, optional): if True, the labels of the options
+            show the counts (eg. "tungsten (42)"). Defaults to False.
+
+    Returns:
+        list: the values, or the options with a label and a value
+    """
+    if not show_counts:
+        return list(counts)
+    return [
+        {"label": f"{value} ({count})", "value": value}
+        for value, count in counts.items()
+    ]
@@ -3,69 +3,186 @@ import plotly.io as pio
 import h_transport_materials as htm
 import numpy as np
 import plotly.express as px
-import json
+from dash_bootstrap_templates import load_figure_template
+from collections import namedtuple
 from datetime import datetime
+import threading
+import time
+
+from .cache import LRUCache, FigureCache
+from .citations import citation_store
+from .columns import PropertyColumns, make_hovertemplate
+from .facets import FacetIndex
+from .index import PropertyIndex
+from .query import FilterQuery
+from .serialize import serialize_figure
+from .store import PropertyStore, make_property
+from .memory import freeze_arrays
+from .metrics import phase, record_cache_request
+from htm_dashboard import FIGURE_CACHE_SIZE, FIGURE_CACHE_TTL, FIGURE_CACHE_DIR
+from htm_dashboard import STORE_FILE, STORE_POLL_INTERVAL
+from htm_dashboard import CITATIONS_TOP
 
 
 TEMPLATE_LIGHT = "plotly_white"
 TEMPLATE_DARK = "cyborg"
 
+# registers the dark template, which also makes it the default
+load_figure_template(TEMPLATE_DARK)
 pio.templates.default = TEMPLATE_LIGHT
 
 
 colour_cycle = px.colors.qualitative.Plotly
 
+k_B = htm.k_B.to(htm.ureg.eV * htm.ureg.particle**-1 * htm.ureg.K**-1).magnitude
+
+Snapshot = namedtuple("Snapshot", ["database", "index", "columns", "facets"])
+
+
+def make_snapshot(database) -> Snapshot:
+    """Indexes a database of properties, which must not be modified"""
+    return Snapshot(
+        database,
+        PropertyIndex(database),
+        PropertyColumns(database),
+        FacetIndex(database),
+    )
+
+
+# each group is published as an immutable snapshot, replaced as a whole when
+# properties are added (read-copy-update), so that readers never lock.
+# Readers needing the database, index and columns of the same state use
+# type_to_snapshot, the other dicts always hold the latest snapshot
+type_to_snapshot = {
+    "diffusivity": make_snapshot(htm.PropertiesGroup(htm.diffusivities)),
+    "solubility": make_snapshot(htm.PropertiesGroup(htm.solubilities)),
+    "permeability": make_snapshot(htm.PropertiesGroup(htm.permeabilities)),
+    "recombination_coeff": make_snapshot(
+        htm.PropertiesGroup(htm.recombination_coeffs)
+    ),
+    "dissociation_coeff": make_snapshot(htm.PropertiesGroup(htm.dissociation_coeffs)),
+}
+
 type_to_database = {
-    "diffusivity": htm.diffusivities,
-    "solubility": htm.solubilities,
-    "permeability": htm.permeabilities,
-    "recombination_coeff": htm.recombination_coeffs,
-    "dissociation_coeff": htm.dissociation_coeffs,
+    group: snapshot.database for group, snapshot in type_to_snapshot.items()
 }
 
+type_to_index = {
+    group: snapshot.index for group, snapshot in type_to_snapshot.items()
+}
 
-def add_mean_value(group: htm.PropertiesGroup, fig: go.Figure):
-    mean_prop = group.mean()
+type_to_columns = {
+    group: snapshot.columns for group, snapshot in type_to_snapshot.items()
+}
+
+# properties added by the users, shared between the workers
+property_store = PropertyStore(STORE_FILE)
+
+
+def freeze_snapshots():
+    """Makes the arrays of the current snapshots read-only, before forking the
+    workers (see wsgi.py)"""
+    for snapshot in type_to_snapshot.values():
+        freeze_arrays(snapshot.index, snapshot.columns)
+
+
+def arrhenius_curves(
+    columns: PropertyColumns, positions, T_bounds=(300, 1200), num=500
+):
+    """Evaluates the Arrhenius law of several properties in one pass, each
+    property over its own temperature range
+
+    Args:
+        columns (PropertyColumns): the columnar snapshot of the database
+        positions (np.ndarray): the positions of the properties
+        T_bounds (tuple, optional): the temperature range used for properties
+            without range. Defaults to (300, 1200).
+        num (int, optional): number of temperatures per curve. Defaults to 500.
+
+    Returns:
+        np.ndarray, np.ndarray: the temperatures in K and the values of
+            the properties, both of shape (len(positions), num)
+    """
+    T_low = columns.range_low[positions]
+    T_high = columns.range_high[positions]
+    no_range = np.isnan(T_low)
+    T_low = np.where(no_range, T_bounds[0], T_low)
+    T_high = np.where(no_range, T_bounds[1], T_high)
+
+    T = T_low[:, None] + (T_high - T_low)[:, None] * np.linspace(0, 1, num)[None, :]
+    pre_exp = columns.pre_exp[positions]
+    act_energy = columns.act_energy[positions]
+    values = pre_exp[:, None] * np.exp(-act_energy[:, None] / (k_B * T))
+    return T, values
+
+
+def mean_arrhenius(columns: PropertyColumns, positions):
+    """Returns the parameters of the mean Arrhenius law of several properties
+    (geometric mean of the pre-exponential factors and arithmetic mean of the
+    activation energies)
+
+    Raises:
+        ValueError: When called on a mixed units group
+
+    Returns:
+        float, float, pint.Unit: the pre-exponential factor, the activation
+            energy in eV/particle and the units of the pre-exponential factor
+    """
+    units_codes = np.unique(columns.units_codes[positions])
+    if len(units_codes) != 1:
+        raise ValueError("Can't compute mean on mixed units groups")
+
+    pre_exp = np.exp(np.mean(np.log(columns.pre_exp[positions])))
+    act_energy = np.mean(columns.act_energy[positions])
+    return pre_exp, act_energy, columns.units[units_codes[0]]
+
+
+def add_mean_value(columns: PropertyColumns, positions, fig: go.Figure):
+    pre_exp, act_energy, units = mean_arrhenius(columns, positions)
+    units_string = columns.units_strings("~H")[columns.units.index(units)]
+    mean_pre_exp = pre_exp * units
+    mean_act_energy = act_energy * htm.ureg.eV * htm.ureg.particle**-1
+    first_prop = columns.database[positions[0]]
     label = "Mean value"
-    T = np.linspace(300, 1200, num=500) * htm.ureg.K
+    T = np.linspace(300, 1200, num=500)
     hovertemplate = (
         "<b>%{text}</b><br><br>"
         + "1/T: %{x:,.2e} K<sup>-1</sup><br>"
         + "T: %{customdata:.0f} K<br>"
     )
-    if isinstance(group[0], htm.Solubility):
+    if isinstance(first_prop, htm.Solubility):
         hovertemplate += (
             "S: %{y:,.2e}"
-            + f"{mean_prop.units:~H} <br>"
-            + f"S_0: {mean_prop.pre_exp:.2e~H} <br>"
-            + f"E_S : {mean_prop.act_energy:.2f~H}"
+            + f"{units_string} <br>"
+            + f"S_0: {mean_pre_exp:.2e~H} <br>"
+            + f"E_S : {mean_act_energy:.2f~H}"
         )
-    elif isinstance(group[0], htm.Diffusivity):
+    elif isinstance(first_prop, htm.Diffusivity):
         hovertemplate += (
             "D: %{y:,.2e} "
-            + f"{mean_prop.units:~H} <br>"
-            + f"D_0: {mean_prop.pre_exp:.2e~H} <br>"
-            + f"E_D : {mean_prop.act_energy:.2f~H}"
+            + f"{units_string} <br>"
+            + f"D_0: {mean_pre_exp:.2e~H} <br>"
+            + f"E_D : {mean_act_energy:.2f~H}"
         )
-    elif isinstance(group[0], htm.RecombinationCoeff):
+    elif isinstance(first_prop, htm.RecombinationCoeff):
         hovertemplate += (
             "Kr: %{y:,.2e}"
-            + f"{mean_prop.units:~H} <br>"
-            + f"Kr_0: {mean_prop.pre_exp:.2e~H} <br>"
-            + f"E_Kr : {mean_prop.act_energy:.2f~H}"
+            + f"{units_string} <br>"
+            + f"Kr_0: {mean_pre_exp:.2e~H} <br>"
+            + f"E_Kr : {mean_act_energy:.2f~H}"
         )
-    elif isinstance(group[0], htm.DissociationCoeff):
+    elif isinstance(first_prop, htm.DissociationCoeff):
         hovertemplate += (
             "Kd: %{y:,.2e}"
-            + f"{mean_prop.units:~H} <br>"
-            + f"Kd_0: {mean_prop.pre_exp:.2e~H} <br>"
-            + f"E_Kd : {mean_prop.act_energy:.2f~H}"
+            + f"{units_string} <br>"
+            + f"Kd_0: {mean_pre_exp:.2e~H} <br>"
+            + f"E_Kd : {mean_act_energy:.2f~H}"
         )
     hovertemplate += "<extra></extra>"
     fig.add_trace(
         go.Scatter(
-            x=1 / T.magnitude,
-            y=mean_prop.value(T).magnitude,
+            x=1 / T,
+            y=pre_exp * np.exp(-act_energy / (k_B * T)),
             name=label,
             mode="lines",
             text=[label] * len(T),
@@ -76,33 +193,236 @@ def add_mean_value(group: htm.PropertiesGroup, fig: go.Figure):
     )
 
 
+def make_graph(
+    columns: PropertyColumns, positions, colour_by="property", T_bounds=(300, 1200)
+):
+    """Creates the graph of the properties, with the curves of all properties
+    evaluated in one pass by arrhenius_curves
+
+    Args:
+        columns (PropertyColumns): the columnar snapshot of the database
+        positions (np.ndarray): the positions of the properties to plot
+        colour_by (str, optional): "property", "material", "isotope", "author".
+            Defaults to "property".
+        T_bounds (tuple, optional): the temperature range used for properties
+            without range. Defaults to (300, 1200).
+
+    Returns:
+        go.Figure: the graph
+    """
+    group = columns.group(positions)
+    prop_to_color = htm.plotting.get_prop_to_color(
+        group, colour_by, colour_cycle=colour_cycle
+    )
+    T, values = arrhenius_curves(columns, positions, T_bounds=T_bounds)
+
+    traces = []
+    for i, prop, T_prop, values_prop in zip(positions, group, T, values):
+        label = columns.labels[i]
+        colour = prop_to_color[prop]
+        # text is a scalar, validating a list of identical labels is slow
+        traces.append(
+            dict(
+                type="scatter",
+                x=1 / T_prop,
+                y=values_prop,
+                name=label,
+                mode="lines",
+                line=dict(color=colour),
+                text=label,
+                customdata=T_prop,
+                hovertemplate=columns.hovertemplates[i],
+            )
+        )
+        if prop.data_T is not None:
+            traces.append(
+                dict(
+                    type="scatter",
+                    x=1 / prop.data_T.magnitude,
+                    y=prop.data_y.magnitude,
+                    name=label,
+                    mode="markers",
+                    marker=dict(color=colour),
+                )
+            )
+
+    fig = go.Figure(data=traces)
+    units = columns.units_strings("~H")[columns.units_codes[positions]]
+    update_axes(fig, group, units=units)
+    return fig
+
+
+def select_positions(
+    type_of_prop: str, materials=[], authors=[], isotopes=[], years=None
+):
+    """Returns the positions in the database of the properties matching the
+    filters
+
+    Returns:
+        np.ndarray: the sorted positions
+    """
+    query = FilterQuery.from_filters(materials, authors, isotopes, years)
+    return query.positions(type_to_snapshot[type_of_prop].index)
+
+
 def make_group_of_properties(
     type_of_prop: str, materials=[], authors=[], isotopes=[], years=None
 ):
+    query = FilterQuery.from_filters(materials, authors, isotopes, years)
+    if query.is_empty:
+        return []
+    snapshot = type_to_snapshot[type_of_prop]
+    return snapshot.columns.group(query.positions(snapshot.index))
+
+
+filter_cache = LRUCache(maxsize=256)
+
+# keys start with the property type and the fingerprint of its columnar snapshot
+figure_cache = FigureCache(
+    maxsize=FIGURE_CACHE_SIZE,
+    ttl=FIGURE_CACHE_TTL,
+    directory=FIGURE_CACHE_DIR,
+    serialize=serialize_figure,
+)
+
+Selection = namedtuple("Selection", ["positions", "group", "columns"])
+
+
+def get_selection(type_of_prop: str, query: FilterQuery) -> Selection:
+    """Returns the positions and the group of the properties matching the
+    query. The result is cached and shared between callbacks: it must not
+    be modified.
+
+    Args:
+        type_of_prop (str): the group of properties (eg. "diffusivity")
+        query (FilterQuery): the normalized filters
+
+    Returns:
+        Selection: the positions in the columns, the corresponding group of
+            properties and the columnar snapshot they were selected from
+    """
+    refresh_database(type_of_prop)
+    snapshot = type_to_snapshot[type_of_prop]
+
+    key = (type_of_prop, len(snapshot.database), query)
+    selection = filter_cache.get(key)
+    record_cache_request("filter", hit=selection is not None)
+    if selection is not None:
+        return selection
+
+    with phase("filter"):
+        positions = query.positions(snapshot.index)
+        if query.is_empty:
+            group = []
+        else:
+            group = snapshot.columns.group(positions)
+    selection = Selection(positions, group, snapshot.columns)
+    filter_cache.set(key, selection)
+    return selection
 
-    if len(materials) * len(authors) * len(isotopes) == 0:
-        filtered_group = []
-    else:
-        database = type_to_database[type_of_prop]
-        filtered_group = (
-            database.filter(material=materials)
-            .filter(author=[author.lower() for author in authors])
-            .filter(isotope=[isotope.lower() for isotope in isotopes])
+
+def get_group_of_properties(
+    type_of_prop: str, materials=[], authors=[], isotopes=[], years=None
+):
+    """Cached version of make_group_of_properties.
+    The returned group is shared between callbacks and must not be modified.
+    """
+    query = FilterQuery.from_filters(materials, authors, isotopes, years)
+    return get_selection(type_of_prop, query).group
+
+
+_publish_lock = threading.RLock()
+
+# id of the last property of the store added to each group, and time of the
+# next poll of the store
+_store_ids = {}
+_next_poll = {}
+
+
+def publish_snapshot(type_of_prop: str, snapshot: Snapshot):
+    """Replaces the snapshot of a group and invalidates the cached filters
+    and figures
+
+    Args:
+        type_of_prop (str): the group of properties (eg. "diffusivity")
+        snapshot (Snapshot): the new snapshot
+    """
+    type_to_snapshot[type_of_prop] = snapshot
+    type_to_database[type_of_prop] = snapshot.database
+    type_to_index[type_of_prop] = snapshot.index
+    type_to_columns[type_of_prop] = snapshot.columns
+    filter_cache.invalidate(lambda key: key[0] == type_of_prop)
+    figure_cache.invalidate(lambda key: key[0] == type_of_prop)
+
+
+def add_property_to_database(type_of_prop: str, *props: htm.Property):
+    """Publishes a new snapshot of a database with properties appended, in
+    this process only (see add_property_to_store)
+
+    Args:
+        type_of_prop (str): the group of the property (eg. "diffusivity")
+        props (htm.Property): the new properties
+    """
+    with _publish_lock:
+        old = type_to_snapshot[type_of_prop]
+        database = htm.PropertiesGroup(list(old.database) + list(props))
+        # the columns keep the strings formatted for the existing properties
+        # and the facets of the materials without new properties are shared
+        snapshot = Snapshot(
+            database,
+            PropertyIndex(database),
+            old.columns.copy_with(database),
+            old.facets.copy_with(database),
         )
-        if years:
-            filtered_group = filtered_group.filter(
-                year=np.arange(years[0], years[1] + 1, step=1).tolist()
-            )
+        publish_snapshot(type_of_prop, snapshot)
 
-    return filtered_group
 
+def add_property_to_store(type_of_prop: str, fields: dict):
+    """Adds a property to the store shared by the workers and to the database
+    of this process
 
-def update_axes(fig, group_of_properties):
+    Args:
+        type_of_prop (str): the group of the property (eg. "diffusivity")
+        fields (dict): the values of the form, see store.make_property
+    """
+    make_property(type_of_prop, fields)  # raises before storing invalid fields
+    property_store.add(type_of_prop, fields)
+    refresh_database(type_of_prop, force=True)
+
+
+def refresh_database(type_of_prop: str, force=False):
+    """Adds to the database the properties added to the store by any worker
+    since the last refresh. The store is polled at most every
+    STORE_POLL_INTERVAL seconds.
+
+    Args:
+        type_of_prop (str): the group of properties (eg. "diffusivity")
+        force (bool, optional): if True, polls the store now. Defaults to False.
+    """
+    now = time.monotonic()
+    if not force and now < _next_poll.get(type_of_prop, 0):
+        return
+    _next_poll[type_of_prop] = now + STORE_POLL_INTERVAL
+    rows = property_store.rows(type_of_prop, after=_store_ids.get(type_of_prop, 0))
+    with _publish_lock:
+        # another thread may have added some of the rows in the meantime
+        rows = [row for row in rows if row[0] > _store_ids.get(type_of_prop, 0)]
+        if len(rows) == 0:
+            return
+        _store_ids[type_of_prop] = rows[-1][0]
+        props = [make_property(type_of_prop, fields) for _, fields in rows]
+        add_property_to_database(type_of_prop, *props)
+
+
+def update_axes(fig, group_of_properties, units=None):
     if len(group_of_properties) == 0:
         return
+    # units (formatted with ~H) of each property, precomputed in the columns
+    if units is None:
+        units = [f"{prop.units:~H}" for prop in group_of_properties]
 
     if isinstance(group_of_properties[0], htm.Solubility):
-        all_units = np.unique([f"{S.units:~H}" for S in group_of_properties]).tolist()
+        all_units = np.unique(units).tolist()
         if len(all_units) == 1:
             yticks_suffix = all_units[0].replace("particle", " H")
             title_units = f"({yticks_suffix})"
@@ -113,15 +433,15 @@ def update_axes(fig, group_of_properties):
         ylabel = f"Solubility {title_units}"
     elif isinstance(group_of_properties[0], htm.Diffusivity):
         ylabel = "Diffusivity"
-        yticks_suffix = f" {group_of_properties[0].units:~H}"
+        yticks_suffix = f" {units[0]}"
     elif isinstance(group_of_properties[0], htm.Permeability):
-        ylabel = f"Permeability {group_of_properties[0].units:~H}"
+        ylabel = f"Permeability {units[0]}"
         yticks_suffix = ""
     elif isinstance(group_of_properties[0], htm.RecombinationCoeff):
         ylabel = "Recombination coefficient"
         yticks_suffix = " m<sup>4</sup>/s"
     elif isinstance(group_of_properties[0], htm.DissociationCoeff):
-        ylabel = f"Dissociation coefficient {group_of_properties[0].units:~H}"
+        ylabel = f"Dissociation coefficient {units[0]}"
         yticks_suffix = ""
 
     xticks_suffix = " K<sup>-1</sup>"
@@ -132,56 +452,69 @@ def update_axes(fig, group_of_properties):
     fig.update_xaxes(title_text="1/T", tickformat=".2e", ticksuffix=xticks_suffix)
 
 
-def make_hovertemplate(prop):
-    # TODO refactor this
-    if isinstance(prop, htm.Solubility):
-        return (
-            "<b>%{text}</b><br><br>"
-            + prop.material.name
-            + "<br>"
-            + "1/T: %{x:,.2e} K<sup>-1</sup><br>"
-            + "T: %{customdata:.0f} K<br>"
-            + "S: %{y:,.2e} "
-            + f"{prop.units:~H}<br>"
-            + f"S_0: {prop.pre_exp:.2e~H} <br>"
-            + f"E_S : {prop.act_energy:.2f~H}"
-            + "<extra></extra>"
-        )
-    elif isinstance(prop, htm.Diffusivity):
-        return (
-            "<b>%{text}</b><br><br>"
-            + prop.material.name
-            + "<br>"
-            + "1/T: %{x:,.2e} K<sup>-1</sup><br>"
-            + "T: %{customdata:.0f} K<br>"
-            + "D: %{y:,.2e} "
-            + f"{prop.units:~H} <br>"
-            + f"D_0: {prop.pre_exp:.2e~H}<br>"
-            + f"E_D : {prop.act_energy:.2f~H}"
-            + "<extra></extra>"
-        )
-    else:
-        return (
-            "<b>%{text}</b><br><br>"
-            + prop.material.name
-            + "<br>"
-            + "1/T: %{x:,.2e} K<sup>-1</sup><br>"
-            + "T: %{customdata:.0f} K<br>"
-            + "value: %{y:,.2e} "
-            + f"{prop.units:~H} <br>"
-            + f"pre-exp: {prop.pre_exp:.2e~H}<br>"
-            + f"act. energy : {prop.act_energy:.2f~H}"
-            + "<extra></extra>"
-        )
+def count_years(years) -> tuple:
+    """Counts the properties published each year, cumulatively, so that the
+    number of properties of any range of years is a difference of two values
+
+    Args:
+        years (np.ndarray): the years of the properties, NaN if unknown
+
+    Returns:
+        tuple: the first year (None if no year is known) and the cumulative
+            counts, cumulative[k] being the number of properties published
+            before first year + k
+    """
+    years = np.asarray(years, dtype=float)
+    years = years[~np.isnan(years)].astype(int)
+    if years.size == 0:
+        return None, np.zeros(1, dtype=int)
+    first = int(years.min())
+    cumulative = np.concatenate([[0], np.cumsum(np.bincount(years - first))])
+    return first, cumulative
+
+
+def get_year_counts(type_of_prop: str, query: FilterQuery) -> tuple:
+    """Cached count_years of the properties matching a query, see
+    get_selection"""
+    snapshot = type_to_snapshot[type_of_prop]
+    key = (type_of_prop, len(snapshot.database), query, "year_counts")
+    year_counts = filter_cache.get(key)
+    if year_counts is None:
+        selection = get_selection(type_of_prop, query)
+        year_counts = count_years(selection.columns.year[selection.positions])
+        filter_cache.set(key, year_counts)
+    return year_counts
+
+
+def year_bins(year_counts: tuple, step: int) -> tuple:
+    """Returns the bins of the per year histogram, aligned on multiples of
+    step, and their number of properties
+
+    Args:
+        year_counts (tuple): the first year and the cumulative counts, see
+            count_years
+        step (int): the width of the bins in years
+
+    Returns:
+        tuple: the first years of the bins and their counts
+    """
+    first, cumulative = year_counts
+    if first is None:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    last = first + len(cumulative) - 2
+    starts = np.arange(first // step * step, last + 1, step)
+    # indices in the cumulative counts of the first and last years + 1
+    low = np.clip(starts - first, 0, len(cumulative) - 1)
+    high = np.clip(starts + step - first, 0, len(cumulative) - 1)
+    return starts, cumulative[high] - cumulative[low]
 
 
 def make_figure_prop_per_year(
-    group, step, selected_years=[1950, int(datetime.today().year)]
+    year_counts, step, selected_years=[1950, int(datetime.today().year)]
 ):
-
-    counts, bins = np.histogram([prop.year for prop in group])
-
-    bins_center = 0.5 * (bins[:-1] + bins[1:])
+    starts, counts = year_bins(year_counts, step)
+    ends = starts + step - 1
+    bins_center = 0.5 * (starts + ends)
     selected = [
         i
         for i, year in enumerate(bins_center)
@@ -193,17 +526,18 @@ def make_figure_prop_per_year(
             go.Bar(
                 x=bins_center,
                 y=counts,
+                width=step,
                 selectedpoints=selected,
             )
         ]
     )
-    template = []
-    for i, year in enumerate(bins[:-1]):
-        year_1 = year
-        year_2 = bins[i + 1]
-        template.append(
-            f"<br>{year_1:.0f} - {year_2:.0f}</br>" + "<extra></extra>" + "%{y}"
-        )
+    if step == 1:
+        template = [f"<br>{start}</br><extra></extra>%{{y}}" for start in starts]
+    else:
+        template = [
+            f"<br>{start} - {end}</br><extra></extra>%{{y}}"
+            for start, end in zip(starts, ends)
+        ]
 
     fig.update_layout(bargap=0)
     fig.update_traces(
@@ -214,47 +548,59 @@ def make_figure_prop_per_year(
     return fig
 
 
-def make_citations_graph(group: htm.PropertiesGroup, per_year: bool = True):
-    references = []
-    nb_citations = []
-    dois = []
-    with open("htm_dashboard/citations.json") as f:
-        citation_data = json.load(f)
-    for prop in group:
-        if prop.doi in citation_data["dois"]:
-            nb_citations_prop = citation_data["dois"][prop.doi]
-        else:
-            nb_citations_prop = prop.nb_citations
-        author = prop.author
-        year = prop.year
-
-        label = "{} ({})".format(author.capitalize(), year)
-
-        if label not in references:
-
-            references.append(label)
-            if per_year:
-                current_year = datetime.now().year
-                nb_citations.append(nb_citations_prop / (current_year - year + 1))
-            else:
-                nb_citations.append(nb_citations_prop)
-
-            if prop.doi is None:
-                dois.append("none")
-            else:
-                dois.append(prop.doi)
-
-    # sort values
-    references = [val_y for _, val_y in sorted(zip(nb_citations, references))]
-    dois = [val_y for _, val_y in sorted(zip(nb_citations, dois))]
-    nb_citations = sorted(nb_citations)
+def make_citations_graph(
+    columns: PropertyColumns, positions, per_year: bool = True, top: int = CITATIONS_TOP
+):
+    """Returns the bar chart of the number of citations of the references of
+    some properties, sorted by number of citations
+
+    Args:
+        columns (PropertyColumns): the columnar snapshot of the database
+        positions (np.ndarray): the positions of the properties
+        per_year (bool, optional): if True, the average number of citations
+            per year since the publication. Defaults to True.
+        top (int, optional): number of most cited references shown, the
+            others are aggregated in a single bar, 0 to show all the
+            references. Defaults to CITATIONS_TOP.
+
+    Returns:
+        go.Figure: the bar chart
+    """
+    # the references of the properties and their first selected property,
+    # whose DOI and number of citations are shown
+    positions = np.asarray(positions, dtype=int)
+    references, first = np.unique(
+        columns.reference_codes[positions], return_index=True
+    )
+    first = positions[first]
+    nb_citations = citation_store.citations(columns, per_year)[first]
+
+    # sorted by number of citations, then by label
+    order = np.argsort(nb_citations, kind="stable")
+    references = references[order]
+    first = first[order]
+    nb_citations = nb_citations[order]
+    nb_others = max(len(references) - top, 0) if top else 0
+
+    dois = columns.dois[first[nb_others:]]
+    labels = columns.references[references[nb_others:]].tolist()
+    values = nb_citations[nb_others:].tolist()
+    customdata = ["none" if doi is None else doi for doi in dois]
+    doi_template = "<b>DOI</b> : %{customdata} <br><extra></extra>"
+    hovertemplates = [doi_template] * len(labels)
+    if nb_others:
+        # at the bottom of the chart, below the least cited reference shown
+        labels.insert(0, f"Others ({nb_others} references)")
+        values.insert(0, nb_citations[:nb_others].sum())
+        customdata.insert(0, "")
+        hovertemplates.insert(0, "%{x:.0f}<extra></extra>")
 
     bar = go.Bar(
-        x=nb_citations,
-        y=references,
+        x=values,
+        y=labels,
         orientation="h",
-        customdata=dois,
-        hovertemplate="<b>DOI</b> " + ": %{customdata} <br>" + "<extra></extra>",
+        customdata=customdata,
+        hovertemplate=hovertemplates,
     )
     fig = go.Figure(bar)
     if per_year:
@@ -265,21 +611,18 @@ def make_citations_graph(group: htm.PropertiesGroup, per_year: bool = True):
     return fig
 
 
-def make_piechart_materials(prop_group):
-    list_of_mats = [prop.material.name for prop in prop_group]
-    labels = np.unique(list_of_mats).tolist()
+def make_piechart_materials(columns: PropertyColumns, positions):
+    counts = columns.counts(columns.material_codes, positions)
+    codes = np.nonzero(counts)[0]
+    labels = columns.materials[codes].tolist()
+    values = counts[codes].tolist()
 
-    values = [list_of_mats.count(mat) for mat in labels]
-
-    colours = []
+    # use the colour of the first property of each material
     prop_to_color = htm.plotting.get_prop_to_color(
-        prop_group, colour_by="material", colour_cycle=colour_cycle
+        columns.group(positions), colour_by="material", colour_cycle=colour_cycle
     )
-    for mat in labels:
-        for prop in prop_group:
-            if prop.material == mat:
-                colours.append(prop_to_color[prop])
-                break
+    _, first = np.unique(columns.material_codes[positions], return_index=True)
+    colours = [prop_to_color[columns.database[i]] for i in positions[first]]
     assert len(colours) == len(labels)
 
     fig = go.Figure(
@@ -294,33 +637,34 @@ def make_piechart_materials(prop_group):
     return fig
 
 
-def make_piechart_isotopes(prop_group):
-    list_of_isotopes = [prop.isotope for prop in prop_group]
+def make_piechart_isotopes(columns: PropertyColumns, positions):
+    counts = columns.counts(columns.isotope_codes, positions)
+    isotope_to_code = {isotope: code for code, isotope in enumerate(columns.isotopes)}
     labels = ["H", "D", "T"]
 
-    values = [list_of_isotopes.count(isotope) for isotope in labels]
+    values = [
+        int(counts[isotope_to_code[isotope]]) if isotope in isotope_to_code else 0
+        for isotope in labels
+    ]
 
     fig = go.Figure(data=[go.Pie(labels=labels, values=values)])
     return fig
 
 
-def make_piechart_author(prop_group):
-    list_of_authors = [prop.author for prop in prop_group]
-    labels = np.unique(list_of_authors).tolist()
+def make_piechart_author(columns: PropertyColumns, positions):
+    counts = columns.counts(columns.author_codes, positions)
+    codes = np.nonzero(counts)[0]
+    labels = columns.authors[codes].tolist()
+    values = counts[codes].tolist()
 
-    colours = []
+    # use the colour of the first property of each author
     prop_to_color = htm.plotting.get_prop_to_color(
-        prop_group, colour_by="author", colour_cycle=colour_cycle
+        columns.group(positions), colour_by="author", colour_cycle=colour_cycle
     )
-    for author in labels:
-        for prop in prop_group:
-            if prop.author == author:
-                colours.append(prop_to_color[prop])
-                break
+    _, first = np.unique(columns.author_codes[positions], return_index=True)
+    colours = [prop_to_color[columns.database[i]] for i in positions[first]]
     assert len(colours) == len(labels)
 
-    values = [list_of_authors.count(isotope) for isotope in labels]
-
     labels = [lab.capitalize() for lab in labels]
 
     fig = go.Figure(
@@ -333,3 +677,79 @@ def make_piechart_author(prop_group):
         ]
     )
     return fig
+
+
+def field_colours(columns: PropertyColumns, positions, field: str, codes) -> list:
+    """Returns the colours of some materials or authors in the pie charts,
+    those of the main graph coloured by the same field (see make_graph)
+
+    Args:
+        columns (PropertyColumns): the columnar snapshot
+        positions (np.ndarray): the positions of the properties of the main
+            graph
+        field (str): "material" or "author"
+        codes (np.ndarray): the codes of the materials or authors
+
+    Returns:
+        list: the colour of the first property of each code in positions,
+            codes absent from positions being given colours of the cycle
+    """
+    prop_to_color = htm.plotting.get_prop_to_color(
+        columns.group(positions), colour_by=field, colour_cycle=colour_cycle
+    )
+    field_codes = getattr(columns, f"{field}_codes")
+    code_to_colour = {}
+    for i in positions:
+        code_to_colour.setdefault(field_codes[i], prop_to_color[columns.database[i]])
+    return [
+        code_to_colour.get(code, colour_cycle[i % len(colour_cycle)])
+        for i, code in enumerate(codes)
+    ]
+
+
+def make_panels_data(columns: PropertyColumns, positions, selected_years=None) -> dict:
+    """Makes the columnar data from which the browser computes the pie charts
+    and the histogram of a tab (see assets/clientside.js)
+
+    Args:
+        columns (PropertyColumns): the columnar snapshot
+        positions (np.ndarray): the positions of the properties selected for
+            all years
+        selected_years (list, optional): the [min, max] years selected for
+            the pie charts, both included. Defaults to None (all years).
+
+    Returns:
+        dict: the years of the properties (None if unknown), their cumulative
+            counts per year (see count_years), the selected years and, for the
+            material, isotope and author of the properties, their codes in the
+            labels (and colours)
+    """
+    years = columns.year[positions]
+    first_year, cumulative = count_years(years)
+    data = {
+        "year": [None if np.isnan(year) else int(year) for year in years],
+        "selected_years": selected_years,
+        "year_counts": {"first": first_year, "cumulative": cumulative.tolist()},
+    }
+    fields = [
+        ("material", columns.material_codes, columns.materials, True),
+        ("isotope", columns.isotope_codes, columns.isotopes, False),
+        ("author", columns.author_codes, columns.authors, True),
+    ]
+    if selected_years is None:
+        in_years = positions
+    else:
+        low, high = selected_years
+        in_years = positions[(years >= low) & (years <= high)]
+    for name, codes, labels, coloured in fields:
+        present, local_codes = np.unique(codes[positions], return_inverse=True)
+        data[name] = {
+            "codes": local_codes.tolist(),
+            "labels": labels[present].tolist(),
+        }
+        if coloured:
+            data[name]["colours"] = field_colours(columns, in_years, name, present)
+    data["author"]["labels"] = [
+        label.capitalize() for label in data["author"]["labels"]
+    ]
+    return data
@@ -0,0 +1,136 @@
+import numpy as np
+
+
+def material_keys(material) -> set:
+    """Returns all the strings a material is equal to (its name, the families
+    of its parents and its symbol for pure metals)
+
+    Args:
+        material (htm.Material or str): the material
+
+    Returns:
+        set: the keys matching the material
+    """
+    if isinstance(material, str):
+        return {material}
+    keys = {material.name}
+    keys.update(parent.family for parent in material.parents)
+    symbol = getattr(material, "symbol", None)
+    if symbol is not None:
+        keys.add(symbol)
+    return keys
+
+
+class PropertyIndex:
+    """Inverted index over a database of properties.
+    Maps each material (including families), author, isotope to the sorted
+    positions of the matching properties in the database, and keeps the
+    positions sorted by year for range queries.
+
+    Args:
+        database (htm.PropertiesGroup): the database to index, which must not
+            be modified. A new index is built when properties are added.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.size = 0
+        self._materials = {}
+        self._authors = {}
+        self._isotopes = {}
+        self._sorted_years = np.empty(0, dtype=int)
+        self._year_order = np.empty(0, dtype=int)
+        self._build()
+
+    def _build(self):
+        materials, authors, isotopes = {}, {}, {}
+        years, year_positions = [], []
+        for i, prop in enumerate(self.database):
+            for key in material_keys(prop.material):
+                materials.setdefault(key, []).append(i)
+            if isinstance(prop.author, str):
+                authors.setdefault(prop.author.lower(), []).append(i)
+            if isinstance(prop.isotope, str):
+                isotopes.setdefault(prop.isotope.lower(), []).append(i)
+            if prop.year is not None:
+                years.append(prop.year)
+                year_positions.append(i)
+
+        def to_arrays(postings):
+            return {key: np.array(val, dtype=int) for key, val in postings.items()}
+
+        self._materials = to_arrays(materials)
+        self._authors = to_arrays(authors)
+        self._isotopes = to_arrays(isotopes)
+
+        years = np.array(years, dtype=int)
+        order = np.argsort(years, kind="stable")
+        self._sorted_years = years[order]
+        self._year_order = np.array(year_positions, dtype=int)[order]
+        self.size = len(self.database)
+
+    @staticmethod
+    def _union(postings, keys):
+        arrays = [postings[key] for key in keys if key in postings]
+        if len(arrays) == 0:
+            return np.empty(0, dtype=int)
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.unique(np.concatenate(arrays))
+
+    def _postings(self, field):
+        return {
+            "material": self._materials,
+            "author": self._authors,
+            "isotope": self._isotopes,
+        }[field]
+
+    def keys(self, field) -> list:
+        """Returns the sorted keys indexed for a field ("material", "author"
+        or "isotope")"""
+        return sorted(self._postings(field))
+
+    def covers(self, field, keys) -> bool:
+        """Returns True if the keys select the same properties as all the keys
+        of the field ("material", "author" or "isotope")"""
+        postings = self._postings(field)
+        selected = self._union(postings, keys)
+        return selected.size == self._union(postings, list(postings)).size
+
+    def material_positions(self, materials):
+        """Returns the sorted positions of the properties matching any of the
+        materials (names, families or symbols)"""
+        return self._union(self._materials, materials)
+
+    def years_between(self, year_min, year_max):
+        """Returns the sorted positions of the properties published between
+        year_min and year_max (included)"""
+        low = np.searchsorted(self._sorted_years, year_min, side="left")
+        high = np.searchsorted(self._sorted_years, year_max, side="right")
+        return np.sort(self._year_order[low:high])
+
+    def query(self, materials=[], authors=[], isotopes=[], years=None):
+        """Returns the positions of the properties matching all the filters
+
+        Args:
+            materials (list, optional): material names or families. Defaults to [].
+            authors (list, optional): lowercase author names. Defaults to [].
+            isotopes (list, optional): lowercase isotopes. Defaults to [].
+            years (tuple, optional): (min, max) years, None for all years.
+                Defaults to None.
+
+        Returns:
+            np.ndarray: the sorted positions in the database
+        """
+        selected = self._union(self._materials, materials)
+        for postings, keys in [(self._authors, authors), (self._isotopes, isotopes)]:
+            if selected.size == 0:
+                break
+            selected = np.intersect1d(
+                selected, self._union(postings, keys), assume_unique=True
+            )
+        if years and selected.size > 0:
+            selected = np.intersect1d(
+                selected, self.years_between(*years), assume_unique=True
+            )
+        return selected
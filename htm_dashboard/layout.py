@@ -1,9 +1,11 @@
 from .infos import text_infos
 from .new_property_form import make_form
-from htm_dashboard import ACTIVE_GROUPS
-from .tab import make_tab
+from htm_dashboard import ACTIVE_GROUPS, WARM_START, LAZY_TABS
+from .tab import make_tab, make_tab_content
+from .warmup import warm_start, get_initial_panels
 
-from dash import html
+import dash
+from dash import dcc, html
 import dash_bootstrap_components as dbc
 from dash_bootstrap_templates import ThemeSwitchAIO
 
@@ -103,16 +105,59 @@ header = dbc.Row(
     align="end",
 )
 
-layout = dbc.Container(
-    [
-        header,
-        html.Hr(),
-        dbc.Tabs(
-            id="tabs-example-graph",
-            children=[make_tab(group) for group in ACTIVE_GROUPS],
-        ),
-    ]
-    + [make_modal_add_property(group) for group in ACTIVE_GROUPS],
-    fluid=True,
-    className="dbc bg-opacity-10 bg-black mb-2",
-)
+# with lazy tabs, only the first tab is rendered on page load
+rendered_groups = ACTIVE_GROUPS[:1] if LAZY_TABS else ACTIVE_GROUPS
+
+if WARM_START:
+    # computed before the workers are forked, see wsgi.py
+    warm_start(rendered_groups)
+
+
+def create_render_tabs_function():
+    def render_tabs(active_tab, rendered, toggle_light=True):
+        """Renders the content of the active tab the first time it is opened,
+        with the graphs of the current theme"""
+        contents = [dash.no_update] * len(ACTIVE_GROUPS)
+        if active_tab in rendered or active_tab not in ACTIVE_GROUPS:
+            return contents + [dash.no_update]
+
+        initial = None
+        if WARM_START:
+            initial = get_initial_panels(active_tab, toggle_light)
+        contents[ACTIVE_GROUPS.index(active_tab)] = make_tab_content(
+            active_tab, initial
+        )
+        return contents + [rendered + [active_tab]]
+
+    return render_tabs
+
+
+def layout():
+    """Returns the layout of the app, built on each page load so that the
+    initial graphs follow the properties added since startup. The theme
+    switch is on the light theme on page load."""
+    initial_panels = {}
+    if WARM_START:
+        initial_panels = {group: get_initial_panels(group) for group in rendered_groups}
+    return dbc.Container(
+        [
+            header,
+            html.Hr(),
+            dbc.Tabs(
+                id="tabs-example-graph",
+                active_tab=ACTIVE_GROUPS[0],
+                children=[
+                    make_tab(
+                        group,
+                        initial_panels.get(group),
+                        render=group in rendered_groups,
+                    )
+                    for group in ACTIVE_GROUPS
+                ],
+            ),
+            dcc.Store(id="rendered_tabs", data=rendered_groups),
+        ]
+        + [make_modal_add_property(group) for group in ACTIVE_GROUPS],
+        fluid=True,
+        className="dbc bg-opacity-10 bg-black mb-2",
+    )
@@ -0,0 +1,55 @@
+import gc
+import resource
+
+import numpy as np
+
+
+def memory_usage(pid="self") -> dict:
+    """Returns the memory used by a process, in bytes. The private memory is
+    the memory not shared with other processes (eg. the pages of a forked
+    worker modified since the fork).
+
+    Args:
+        pid (int or str, optional): the process id. Defaults to "self".
+
+    Returns:
+        dict: rss, pss (memory shared with n processes counts for 1/n) and
+            private memory. On systems without /proc, only the peak rss of
+            the current process is available and used for all the values.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return {"rss": peak, "pss": peak, "private": peak}
+
+    values = {}
+    for line in lines[1:]:
+        key, value = line.split(":")
+        values[key] = int(value.split()[0]) * 1024
+    return {
+        "rss": values["Rss"],
+        "pss": values["Pss"],
+        "private": values["Private_Clean"] + values["Private_Dirty"],
+    }
+
+
+def freeze_arrays(*objects):
+    """Makes the numpy arrays held by objects (as attributes or in dicts of
+    arrays) read-only, so that they are never written after the workers are
+    forked and stay shared"""
+    for obj in objects:
+        for value in vars(obj).values():
+            arrays = value.values() if isinstance(value, dict) else [value]
+            for array in arrays:
+                if isinstance(array, np.ndarray):
+                    array.flags.writeable = False
+
+
+def freeze_heap():
+    """Moves all the objects allocated so far to the permanent generation of
+    the garbage collector. Collections in the forked workers then never touch
+    them, which would copy their pages."""
+    gc.collect()
+    gc.freeze()
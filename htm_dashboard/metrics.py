@@ -0,0 +1,253 @@
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import flask
+
+from htm_dashboard import METRICS, SLOW_CALLBACK_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+METRICS_ROUTE = "/metrics"
+
+# upper bounds of the buckets of the histogram of the callback durations
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# (group, callback) of the running callback
+_current_labels = contextvars.ContextVar("htm_dashboard_callback", default=None)
+# phases of the running callback: {phase: duration}
+_current_phases = contextvars.ContextVar("htm_dashboard_phases", default=None)
+
+
+def _format_labels(labels: dict) -> str:
+    def escape(value):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        return value.replace("\n", "\\n")
+
+    return ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+class CallbackMetrics:
+    """Timings of the callbacks of the app, exposed in the Prometheus text
+    format. Each gunicorn worker has its own metrics.
+
+    Args:
+        buckets (list, optional): upper bounds of the buckets of the
+            histogram of the durations, in seconds. Defaults to
+            DURATION_BUCKETS.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = list(buckets)
+        self._lock = threading.Lock()
+        # (group, callback): [count per bucket..., sum, count]
+        self._durations = {}
+        # (group, callback, phase): [sum, count]
+        self._phases = {}
+        # (group, callback): [sum, count]
+        self._sizes = {}
+        # (group, callback, cache, result): count
+        self._cache_requests = {}
+
+    def observe_callback(self, group: str, callback: str, duration: float, phases):
+        """Records a call of a callback
+
+        Args:
+            group (str): the group of properties of the callback
+            callback (str): the name of the callback
+            duration (float): the wall time in seconds
+            phases (dict): the time spent in each phase ("filter", "figure",
+                "serialize"), in seconds
+        """
+        with self._lock:
+            values = self._durations.setdefault(
+                (group, callback), [0] * len(self.buckets) + [0.0, 0]
+            )
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    values[i] += 1
+            values[-2] += duration
+            values[-1] += 1
+            for phase, phase_duration in phases.items():
+                values = self._phases.setdefault((group, callback, phase), [0.0, 0])
+                values[0] += phase_duration
+                values[1] += 1
+
+    def observe_size(self, group: str, callback: str, size: int):
+        """Records the size in bytes of the response of a callback"""
+        with self._lock:
+            values = self._sizes.setdefault((group, callback), [0, 0])
+            values[0] += size
+            values[1] += 1
+
+    def count_cache_request(self, group: str, callback: str, cache: str, hit: bool):
+        """Counts a hit or a miss of a cache ("filter" or "figure")"""
+        key = (group, callback, cache, "hit" if hit else "miss")
+        with self._lock:
+            self._cache_requests[key] = self._cache_requests.get(key, 0) + 1
+
+    def to_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text format"""
+        lines = []
+
+        def header(name, kind, description):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def summary(name, values):
+            for labels, (total, count) in values:
+                labels = _format_labels(labels)
+                lines.append(f"{name}_sum{{{labels}}} {total}")
+                lines.append(f"{name}_count{{{labels}}} {count}")
+
+        with self._lock:
+            name = "htm_dashboard_callback_duration_seconds"
+            header(name, "histogram", "Wall time of the callbacks.")
+            for (group, callback), values in sorted(self._durations.items()):
+                labels = {"group": group, "callback": callback}
+                bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, values[:-2] + values[-1:]):
+                    bucket_labels = _format_labels({**labels, "le": bound})
+                    lines.append(f"{name}_bucket{{{bucket_labels}}} {count}")
+            summary(
+                name,
+                [
+                    ({"group": group, "callback": callback}, values[-2:])
+                    for (group, callback), values in sorted(self._durations.items())
+                ],
+            )
+
+            name = "htm_dashboard_callback_phase_seconds"
+            header(
+                name,
+                "summary",
+                "Time spent by the callbacks filtering the properties, building "
+                "and serializing the figures.",
+            )
+            summary(
+                name,
+                [
+                    ({"group": group, "callback": callback, "phase": phase}, values)
+                    for (group, callback, phase), values in sorted(self._phases.items())
+                ],
+            )
+
+            name = "htm_dashboard_callback_response_bytes"
+            header(name, "summary", "Size of the responses of the callbacks.")
+            summary(
+                name,
+                [
+                    ({"group": group, "callback": callback}, values)
+                    for (group, callback), values in sorted(self._sizes.items())
+                ],
+            )
+
+            name = "htm_dashboard_cache_requests_total"
+            header(name, "counter", "Hits and misses of the filter and figure caches.")
+            for key, count in sorted(self._cache_requests.items()):
+                labels = dict(zip(["group", "callback", "cache", "result"], key))
+                lines.append(f"{name}{{{_format_labels(labels)}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+callback_metrics = CallbackMetrics()
+
+
+@contextmanager
+def phase(name: str):
+    """Adds the time spent in the block to a phase of the running callback
+    (eg. "filter", "figure", "serialize"), does nothing outside callbacks"""
+    phases = _current_phases.get()
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0) + time.perf_counter() - start
+
+
+def record_cache_request(cache: str, hit: bool):
+    """Counts a hit or a miss of a cache by the running callback"""
+    labels = _current_labels.get()
+    if labels is not None:
+        callback_metrics.count_cache_request(*labels, cache, hit)
+
+
+def instrument(function, group: str = None, name: str = None):
+    """Wraps a callback to record its timings in callback_metrics and log it
+    when it's slower than HTM_DASHBOARD_SLOW_CALLBACK_THRESHOLD
+
+    Args:
+        function (callable): the callback
+        group (str, optional): the group of properties of the callback.
+            Defaults to None.
+        name (str, optional): the name of the callback. Defaults to the name
+            of the function.
+
+    Returns:
+        callable: the instrumented callback, or function if the metrics are
+            disabled
+    """
+    if not METRICS:
+        return function
+    labels = (group or "", name or function.__name__)
+
+    @functools.wraps(function)
+    def instrumented(*args, **kwargs):
+        phases = {}
+        labels_token = _current_labels.set(labels)
+        phases_token = _current_phases.set(phases)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            _current_phases.reset(phases_token)
+            _current_labels.reset(labels_token)
+            callback_metrics.observe_callback(*labels, duration, phases)
+            if flask.has_request_context():
+                # the size of the response is recorded once it's serialized
+                flask.g.htm_dashboard_callback = labels
+            slow = SLOW_CALLBACK_THRESHOLD is not None
+            if slow and duration > SLOW_CALLBACK_THRESHOLD:
+                details = ", ".join(
+                    f"{phase_name} {phase_duration:.3f} s"
+                    for phase_name, phase_duration in phases.items()
+                )
+                logger.warning(
+                    f"slow callback: {labels[0]} {labels[1]} took {duration:.3f} s"
+                    f" ({details or 'no phase recorded'})"
+                )
+
+    return instrumented
+
+
+def register_metrics_route(server: flask.Flask):
+    """Adds the /metrics endpoint and records the size of the responses of
+    the instrumented callbacks
+
+    Args:
+        server (flask.Flask): the server of the app
+    """
+    if not METRICS:
+        return
+
+    @server.after_request
+    def record_response_size(response):
+        labels = flask.g.pop("htm_dashboard_callback", None)
+        if labels is not None and not response.is_streamed:
+            callback_metrics.observe_size(*labels, response.content_length or 0)
+        return response
+
+    def metrics():
+        return flask.Response(
+            callback_metrics.to_prometheus(),
+            mimetype="text/plain; version=0.0.4",
+        )
+
+    server.add_url_rule(METRICS_ROUTE, "metrics", metrics)
@@ -0,0 +1,96 @@
+from dataclasses import dataclass, replace
+import sys
+
+import numpy as np
+
+
+def _normalize(values, lower=False) -> tuple:
+    values = set(values or [])
+    if lower:
+        values = set(value.lower() for value in values)
+    return tuple(sys.intern(str(value)) for value in sorted(values))
+
+
+@dataclass(frozen=True)
+class FilterQuery:
+    """Normalized filters of a tab. Two queries selecting the same properties
+    are equal and have the same hash, so queries are used as cache keys.
+
+    Args:
+        materials (tuple, optional): sorted material names or families.
+            Defaults to ().
+        authors (tuple, optional): sorted lowercase authors. Defaults to ().
+        isotopes (tuple, optional): sorted lowercase isotopes. Defaults to ().
+        years (tuple, optional): (min, max) years, both included, None for
+            all years. Defaults to None.
+    """
+
+    materials: tuple = ()
+    authors: tuple = ()
+    isotopes: tuple = ()
+    years: tuple = None
+
+    @classmethod
+    def from_filters(cls, materials=None, authors=None, isotopes=None, years=None):
+        """Makes a query from the values of the filters of a tab
+
+        Args:
+            materials (list, optional): the selected materials. Defaults to None.
+            authors (list, optional): the selected authors. Defaults to None.
+            isotopes (list, optional): the selected isotopes. Defaults to None.
+            years (list, optional): the selected [min, max] years. Defaults to None.
+
+        Returns:
+            FilterQuery: the query
+        """
+        if years:
+            years = (int(years[0]), int(years[1]))
+        else:
+            years = None
+        return cls(
+            materials=_normalize(materials),
+            authors=_normalize(authors, lower=True),
+            isotopes=_normalize(isotopes, lower=True),
+            years=years,
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        """True if the query can't select any property"""
+        return len(self.materials) * len(self.authors) * len(self.isotopes) == 0
+
+    def without_years(self):
+        """Returns the same query for all years"""
+        return replace(self, years=None)
+
+    def positions(self, index) -> np.ndarray:
+        """Returns the positions of the properties matching the query
+
+        Args:
+            index (PropertyIndex): the index of the database
+
+        Returns:
+            np.ndarray: the sorted positions
+        """
+        if self.is_empty:
+            return np.empty(0, dtype=int)
+        return index.query(
+            materials=self.materials,
+            authors=self.authors,
+            isotopes=self.isotopes,
+            years=self.years,
+        )
+
+    def to_dict(self) -> dict:
+        """Returns the canonical representation of the query, used in the
+        exported files
+
+        Returns:
+            dict: the materials, authors, isotopes and years
+        """
+        return {
+            "materials": list(self.materials),
+            "authors": list(self.authors),
+            "isotopes": list(self.isotopes),
+            "years": None if self.years is None else list(self.years),
+        }
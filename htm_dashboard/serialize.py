@@ -0,0 +1,63 @@
+import json
+
+import plotly.io as pio
+
+from htm_dashboard import COMPACT_FIGURES
+from .metrics import phase
+
+# trace attributes collapsed into a scalar when all their values are equal
+LABEL_ARRAYS = ["text", "hovertext", "hovertemplate"]
+
+
+def prune_template(figure: dict):
+    """Removes from the template of a serialized figure the defaults of the
+    trace types it doesn't contain, in place"""
+    template = figure.get("layout", {}).get("template")
+    if not template or "data" not in template:
+        return
+    trace_types = {trace.get("type", "scatter") for trace in figure.get("data", [])}
+    template["data"] = {
+        trace_type: defaults
+        for trace_type, defaults in template["data"].items()
+        if trace_type in trace_types
+    }
+
+
+def compact_figure(figure: dict) -> dict:
+    """Reduces the size of a serialized figure, in place: the text and hover
+    arrays with a single value become scalars and the unused parts of the
+    template are removed
+
+    Args:
+        figure (dict): the serialized figure
+
+    Returns:
+        dict: the figure
+    """
+    for trace in figure.get("data", []):
+        for key in LABEL_ARRAYS:
+            values = trace.get(key)
+            if isinstance(values, list) and len(values) > 0:
+                first = values[0]
+                if isinstance(first, str) and all(value == first for value in values):
+                    trace[key] = first
+    prune_template(figure)
+    return figure
+
+
+def serialize_figure(figure) -> dict:
+    """Serializes a figure sent to the browser, compacted according to
+    HTM_DASHBOARD_COMPACT_FIGURES
+
+    Args:
+        figure (go.Figure or dict): the figure
+
+    Returns:
+        dict: the serialized figure
+    """
+    with phase("serialize"):
+        if not isinstance(figure, dict):
+            figure = json.loads(pio.to_json(figure, validate=False))
+        if COMPACT_FIGURES:
+            compact_figure(figure)
+    return figure
@@ -0,0 +1,108 @@
+import numpy as np
+
+
+def decimate_curve(x, y, tolerance: float, min_points: int = 2) -> np.ndarray:
+    """Returns the indices of the points of a curve to keep so that the curve
+    linearly interpolated between them differs from the original one by less
+    than tolerance in log10(y) (Ramer-Douglas-Peucker on the vertical error).
+    Arrhenius laws are straight lines in log(y) vs 1/T and reduce to a few
+    points.
+
+    Args:
+        x (np.ndarray): the abscissas, monotonic
+        y (np.ndarray): the ordinates
+        tolerance (float): the maximum error in decades
+        min_points (int, optional): minimum number of points kept, evenly
+            spaced along the curve. Defaults to 2.
+
+    Returns:
+        np.ndarray: the sorted indices of the kept points
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n <= 2 or np.any(~(y > 0)) or not np.all(np.isfinite(x)):
+        return np.arange(n)
+
+    log_y = np.log10(y)
+    keep = np.zeros(n, dtype=bool)
+    keep[np.linspace(0, n - 1, min(max(min_points, 2), n)).round().astype(int)] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx = x[end] - x[start]
+        if dx == 0:
+            slope = 0
+        else:
+            slope = (log_y[end] - log_y[start]) / dx
+        interpolated = log_y[start] + slope * (x[start : end + 1] - x[start])
+        errors = np.abs(log_y[start : end + 1] - interpolated)
+        i = int(np.argmax(errors))
+        if errors[i] > tolerance:
+            keep[start + i] = True
+            stack.append((start, start + i))
+            stack.append((start + i, end))
+    return np.flatnonzero(keep)
+
+
+def round_significant(values, digits: int) -> np.ndarray:
+    """Rounds values to a number of significant digits, so that they are
+    serialized with at most this number of digits
+
+    Args:
+        values (np.ndarray): the values
+        digits (int): the number of significant digits
+
+    Returns:
+        np.ndarray: the rounded values
+    """
+    values = np.asarray(values, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        exponent = np.floor(np.log10(np.abs(values)))
+    exponent = np.where(np.isfinite(exponent), exponent, 0)
+    decimals = digits - 1 - exponent
+    # multiplying or dividing by exact powers of ten gives the closest floats
+    # to the rounded decimals
+    scale = 10.0 ** np.abs(decimals)
+    return np.where(
+        decimals >= 0,
+        np.round(values * scale) / scale,
+        np.round(values / scale) * scale,
+    )
+
+
+def simplify_figure(fig, tolerance: float, min_points: int = 2, digits: int = 0):
+    """Decimates the line traces of an Arrhenius graph and rounds their
+    coordinates, in place. The arrays of the traces having one value per point
+    (customdata, text...) are decimated alongside.
+
+    Args:
+        fig (go.Figure): the figure, with a log y axis
+        tolerance (float): the maximum error in decades, if 0 all the points
+            are kept
+        min_points (int, optional): minimum number of points per curve.
+            Defaults to 2.
+        digits (int, optional): number of significant digits of the
+            coordinates, if 0 they aren't rounded. Defaults to 0.
+    """
+    for trace in fig.data:
+        if trace.type != "scatter" or trace.mode != "lines" or trace.x is None:
+            continue
+        x = np.asarray(trace.x, dtype=float)
+        if tolerance > 0:
+            keep = decimate_curve(x, trace.y, tolerance, min_points)
+        else:
+            keep = np.arange(len(x))
+
+        updates = {}
+        for name in ["x", "y", "customdata", "text", "hovertext"]:
+            value = trace[name]
+            if value is None or isinstance(value, str) or len(value) != len(x):
+                continue
+            value = np.asarray(value)[keep]
+            if digits > 0 and value.dtype.kind == "f":
+                value = round_significant(value, digits)
+            updates[name] = value
+        trace.update(updates)
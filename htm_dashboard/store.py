@@ -0,0 +1,125 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import h_transport_materials as htm
+
+
+def make_property(group: str, fields: dict) -> htm.Property:
+    """Creates a property from the values of the "Add property" form
+
+    Args:
+        group (str): the group of the property (eg. "diffusivity")
+        fields (dict): pre_exp, act_energy, author, year, isotope, material,
+            range (low, high) and for solubilities law
+
+    Returns:
+        htm.Property: the property
+    """
+    if group == "diffusivity":
+        prop = htm.Diffusivity(D_0=fields["pre_exp"], E_D=fields["act_energy"])
+    elif group == "solubility":
+        prop = htm.Solubility(
+            S_0=fields["pre_exp"], E_S=fields["act_energy"], law=fields.get("law")
+        )
+    elif group == "recombination_coeff":
+        prop = htm.RecombinationCoeff(
+            pre_exp=fields["pre_exp"], act_energy=fields["act_energy"]
+        )
+    else:
+        raise ValueError(f"Properties can't be added to {group}")
+
+    prop.author = fields["author"].lower()
+    prop.year = fields["year"]
+    prop.isotope = fields["isotope"]
+    # TODO find a way to find potentially already existing material (like tungsten)
+    prop.material = htm.Material(name=fields["material"])
+    prop.range = tuple(fields["range"])
+    return prop
+
+
+class PropertyStore:
+    """SQLite store of the properties added by the users. With a file, all
+    the workers of the app share the same properties.
+
+    Args:
+        filename (str, optional): the SQLite database file. If None, the
+            store is in memory and private to the process. Defaults to None.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared with forked workers, each
+        # process opens its own
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(
+                self.filename or ":memory:", check_same_thread=False, timeout=30
+            )
+            self._pid = os.getpid()
+            with self._connection:
+                if self.filename is not None:
+                    # readers don't block the writer of another worker
+                    self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute(
+                    """CREATE TABLE IF NOT EXISTS properties (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        property_group TEXT NOT NULL,
+                        fields TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    )"""
+                )
+        return self._connection
+
+    def add(self, group: str, fields: dict) -> int:
+        """Adds a property
+
+        Args:
+            group (str): the group of the property (eg. "diffusivity")
+            fields (dict): the values of the form, see make_property
+
+        Returns:
+            int: the id of the property
+        """
+        with self._lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO properties (property_group, fields, created_at) "
+                "VALUES (?, ?, ?)",
+                (group, json.dumps(fields), time.time()),
+            )
+        return cursor.lastrowid
+
+    def last_id(self, group: str) -> int:
+        """Returns the id of the last property added to a group, 0 if none"""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT MAX(id) FROM properties WHERE property_group = ?", (group,)
+            ).fetchone()
+        return row[0] or 0
+
+    def rows(self, group: str, after: int = 0) -> list:
+        """Returns the properties of a group added after a given id
+
+        Args:
+            group (str): the group of properties (eg. "diffusivity")
+            after (int, optional): only the properties with a greater id are
+                returned. Defaults to 0.
+
+        Returns:
+            list: the (id, fields) of the properties, in the order they were
+                added
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT id, fields FROM properties "
+                "WHERE property_group = ? AND id > ? ORDER BY id",
+                (group, after),
+            ).fetchall()
+        return [(id_, json.loads(fields)) for id_, fields in rows]
@@ -3,15 +3,25 @@ from dash import html
 import dash_bootstrap_components as dbc
 import dash_daq as daq
 
-import h_transport_materials as htm
 import numpy as np
-import json
 
-materials_options = list(set([prop.material.name for prop in htm.database]))
-materials_options += list(set([prop.material.family for prop in htm.database]))
+from .citations import citation_store
+
+from .graph import type_to_columns, type_to_snapshot
+from .export import export_url
+from .query import FilterQuery
+from .facets import make_options
+from htm_dashboard import FACET_COUNTS
 
 isotope_options = ["H", "D", "T"]
 
+# widths in years of the bins of the per year histogram
+YEAR_BIN_WIDTHS = [1, 2, 5, 10]
+DEFAULT_YEAR_BIN_WIDTH = 5
+
+# labels of the items of the "Extract data" menu
+EXPORT_LABELS = {"json": "JSON", "csv": "CSV", "parquet": "Parquet", "arrow": "Arrow"}
+
 pretty_label = {
     "diffusivity": "Diffusivity",
     "solubility": "Solubility",
@@ -21,15 +31,98 @@ pretty_label = {
 }
 
 
-def make_tab(property: str):
-    """_summary_
+initial_material = "tungsten"
+
+
+def make_materials_options(property: str) -> list:
+    """Returns the options of the material filter of a tab: the sorted
+    material names followed by the sorted families, with their number of
+    properties if HTM_DASHBOARD_FACET_COUNTS is set
+
+    Args:
+        property (str): the group of properties (eg. "diffusivity")
+
+    Returns:
+        list: the options
+    """
+    facets = type_to_snapshot[property].facets
+    return make_options(facets.material_counts(), show_counts=FACET_COUNTS)
+
+
+def make_authors_options(property: str, materials: list) -> list:
+    """Returns the options of the author filter of a tab: the capitalized
+    authors of the properties of some materials, with their number of
+    properties if HTM_DASHBOARD_FACET_COUNTS is set
+
+    Args:
+        property (str): the group of properties (eg. "diffusivity")
+        materials (list): material names or families
+
+    Returns:
+        list: the options, sorted
+    """
+    facets = type_to_snapshot[property].facets
+    return make_options(facets.author_counts(materials), show_counts=FACET_COUNTS)
+
+
+def initial_filters(property: str) -> dict:
+    """Returns the values of the filters of a tab when the page is loaded
+
+    Args:
+        property (str): the group of properties (eg. "diffusivity")
+
+    Returns:
+        dict: the materials, isotopes, authors and [min, max] years
+    """
+    years = type_to_columns[property].year
+    return {
+        "materials": [initial_material],
+        "isotopes": isotope_options,
+        "authors": type_to_snapshot[property].facets.authors([initial_material]),
+        "years": [int(np.nanmin(years)), int(np.nanmax(years))],
+    }
+
+
+def initial_value(initial: dict, key: str, prop: str = "figure") -> dict:
+    """Returns the keyword arguments setting the initial figure of a graph
+    (or another property of a component), empty if it wasn't precomputed"""
+    if initial is None or key not in initial:
+        return {}
+    return {prop: initial[key]}
+
+
+def make_tab(property: str, initial: dict = None, render: bool = True):
+    """Makes the tab of a group of properties
 
     Args:
-        property (str): _description_
+        property (str): the group of properties (eg. "diffusivity")
+        initial (dict, optional): precomputed initial values of the graphs
+            of the tab, see warmup.compute_initial_panels. Defaults to None.
+        render (bool, optional): if False, the content of the tab is left
+            empty, to be rendered when the tab is opened. Defaults to True.
 
     Returns:
         dbc.Tab: the tab
     """
+    children = make_tab_content(property, initial) if render else []
+    return dbc.Tab(
+        html.Div(children, id=f"tab_content_{property}"),
+        label=pretty_label[property],
+        tab_id=property,
+    )
+
+
+def make_tab_content(property: str, initial: dict = None):
+    """Makes the controls, graphs and table of a tab
+
+    Args:
+        property (str): the group of properties (eg. "diffusivity")
+        initial (dict, optional): precomputed initial values of the graphs
+            of the tab, see warmup.compute_initial_panels. Defaults to None.
+
+    Returns:
+        list: the content of the tab
+    """
 
     assert property in [
         "diffusivity",
@@ -39,33 +132,16 @@ def make_tab(property: str):
         "dissociation_coeff",
     ]
 
-    property_to_group = {
-        "diffusivity": htm.diffusivities,
-        "solubility": htm.solubilities,
-        "permeability": htm.permeabilities,
-        "recombination_coeff": htm.recombination_coeffs,
-        "dissociation_coeff": htm.dissociation_coeffs,
-    }
-
-    all_properties = property_to_group[property]
-
-    initial_material = "tungsten"
-
-    authors_options = np.unique(
-        [
-            prop.author.capitalize()
-            for prop in all_properties
-            if prop.material == "tungsten"
-        ]
-    ).tolist()
-
-    years_options = [prop.year for prop in all_properties]
-    min_year = min(years_options)
-    max_year = max(years_options)
+    filters = initial_filters(property)
+    initial_query = FilterQuery.from_filters(**filters)
+    min_year, max_year = filters["years"]
 
     table = make_table(property)
 
-    table_tab = dbc.Tab([table], label="Table")
+    # the filters of the rows of the table, see
+    # callbacks.create_update_table_data_function
+    table_filters = dcc.Store(id=f"table_filters_{property}")
+    table_tab = dbc.Tab([table, table_filters], label="Table", tab_id="table")
 
     graph_tab = dbc.Tab(
         [
@@ -89,6 +165,7 @@ def make_tab(property: str):
                                     dcc.Graph(
                                         id=f"graph_{property}",
                                         style={"height": "600px"},
+                                        **initial_value(initial, "graph"),
                                     )
                                 ],
                                 width=10,
@@ -101,16 +178,19 @@ def make_tab(property: str):
             )
         ],
         label="Graph",
+        tab_id="graph",
     )
 
-    sub_tabs = dbc.Tabs([graph_tab, table_tab], id=f"subtabs_{property}")
+    sub_tabs = dbc.Tabs(
+        [graph_tab, table_tab], id=f"subtabs_{property}", active_tab="graph"
+    )
 
     controls = dbc.Card(
         [
             html.Label("Filter by material:"),
             dcc.Dropdown(
-                options=materials_options,
-                value=[initial_material],
+                options=make_materials_options(property),
+                value=filters["materials"],
                 multi=True,
                 id=f"material_filter_{property}",
             ),
@@ -124,7 +204,7 @@ def make_tab(property: str):
             html.Br(),
             dbc.Label("Filter by isotope:"),
             dbc.Checklist(
-                value=isotope_options,
+                value=filters["isotopes"],
                 options=[{"label": i, "value": i} for i in isotope_options],
                 inline=True,
                 id=f"isotope_filter_{property}",
@@ -132,8 +212,8 @@ def make_tab(property: str):
             html.Br(),
             html.Label("Filter by author:"),
             dcc.Dropdown(
-                value=authors_options,
-                options=authors_options,
+                value=filters["authors"],
+                options=make_authors_options(property, filters["materials"]),
                 multi=True,
                 id=f"author_filter_{property}",
             ),
@@ -179,15 +259,21 @@ def make_tab(property: str):
                         style={"margin": "5px"},
                         n_clicks="0",
                     ),
-                    dbc.Button(
+                    dbc.DropdownMenu(
                         [
-                            "Extract data",
-                            dcc.Download(id=f"download-text_{property}"),
+                            dbc.DropdownMenuItem(
+                                label,
+                                id=f"extract_{fmt}_{property}",
+                                href=export_url(property, initial_query, fmt),
+                                external_link=True,
+                            )
+                            for fmt, label in EXPORT_LABELS.items()
                         ],
+                        label="Extract data",
                         id=f"extract_button_{property}",
                         color="primary",
+                        group=True,
                         style={"margin": "5px"},
-                        n_clicks="0",
                     ),
                     dbc.Button(
                         [
@@ -204,15 +290,26 @@ def make_tab(property: str):
         ],
         body=True,
     )
-    with open("htm_dashboard/citations.json") as f:
-        citation_data = json.load(f)
-    date_citations = citation_data["date"]
+    date_citations = citation_store.date
     graph_prop_per_year = dbc.Card(
         [
             dbc.CardBody(
                 [
                     html.H4("Number of properties per year", className="card-title"),
-                    dcc.Graph(id=f"graph_prop_per_year_{property}"),
+                    dcc.Graph(
+                        id=f"graph_prop_per_year_{property}",
+                        **initial_value(initial, "prop_per_year"),
+                    ),
+                    dbc.Label("Bin width (years):"),
+                    dbc.RadioItems(
+                        options=[
+                            {"label": width, "value": width}
+                            for width in YEAR_BIN_WIDTHS
+                        ],
+                        value=DEFAULT_YEAR_BIN_WIDTH,
+                        inline=True,
+                        id=f"year_bin_width_{property}",
+                    ),
                 ]
             )
         ],
@@ -240,7 +337,12 @@ def make_tab(property: str):
                                 width=1,
                             ),
                             dbc.Col(
-                                [dcc.Graph(id=f"graph_nb_citations_{property}")],
+                                [
+                                    dcc.Graph(
+                                        id=f"graph_nb_citations_{property}",
+                                        **initial_value(initial, "nb_citations"),
+                                    )
+                                ],
                                 width=11,
                             ),
                         ],
@@ -257,7 +359,10 @@ def make_tab(property: str):
             dbc.CardBody(
                 [
                     html.H4("Repartition by materials", className="card-title"),
-                    dcc.Graph(id=f"graph_materials_{property}"),
+                    dcc.Graph(
+                        id=f"graph_materials_{property}",
+                        **initial_value(initial, "materials"),
+                    ),
                 ]
             )
         ],
@@ -268,7 +373,10 @@ def make_tab(property: str):
             dbc.CardBody(
                 [
                     html.H4("Repartition by isotopes", className="card-title"),
-                    dcc.Graph(id=f"graph_isotopes_{property}"),
+                    dcc.Graph(
+                        id=f"graph_isotopes_{property}",
+                        **initial_value(initial, "isotopes"),
+                    ),
                 ]
             )
         ],
@@ -279,44 +387,49 @@ def make_tab(property: str):
             dbc.CardBody(
                 [
                     html.H4("Repartition by authors", className="card-title"),
-                    dcc.Graph(id=f"graph_authors_{property}"),
+                    dcc.Graph(
+                        id=f"graph_authors_{property}",
+                        **initial_value(initial, "authors"),
+                    ),
                 ]
             )
         ],
         className="mb-2",
     )
 
-    tab = dbc.Tab(
-        label=pretty_label[property],
-        children=[
-            dbc.Row(
-                [
-                    dbc.Col(
-                        [controls],
-                        width=3,
-                        style={"overflow-y": "auto", "maxHeight": "600px"},
-                    ),
-                    dbc.Col([sub_tabs]),
-                ],
-            ),
-            dbc.Row(
-                [
-                    dbc.Col([graph_prop_per_year], width=3),
-                    dbc.Col([graph_citations], width=4),
-                    dbc.Col([piechart_materials], width=4),
-                ],
-                justify="evenly",
-            ),
-            dbc.Row(
-                [
-                    dbc.Col([piechart_isotopes], width=4),
-                    dbc.Col([piechart_authors], width=4),
-                ],
-                justify="evenly",
-            ),
-        ],
+    # data of the pie charts and of the histogram, computed in the browser
+    panels_data = dcc.Store(
+        id=f"panels_data_{property}", **initial_value(initial, "panels_data", "data")
     )
-    return tab
+
+    return [
+        panels_data,
+        dbc.Row(
+            [
+                dbc.Col(
+                    [controls],
+                    width=3,
+                    style={"overflow-y": "auto", "maxHeight": "600px"},
+                ),
+                dbc.Col([sub_tabs]),
+            ],
+        ),
+        dbc.Row(
+            [
+                dbc.Col([graph_prop_per_year], width=3),
+                dbc.Col([graph_citations], width=4),
+                dbc.Col([piechart_materials], width=4),
+            ],
+            justify="evenly",
+        ),
+        dbc.Row(
+            [
+                dbc.Col([piechart_isotopes], width=4),
+                dbc.Col([piechart_authors], width=4),
+            ],
+            justify="evenly",
+        ),
+    ]
 
 
 TABLE_KEYS = [
@@ -359,6 +472,8 @@ def make_table_labels(property):
 
 
 def make_table(property):
+    """Returns the table of a tab. Its rows are sorted and paged by the
+    server (see callbacks.create_update_table_data_function)"""
 
     table = dash_table.DataTable(
         id=f"table_{property}",
@@ -376,10 +491,14 @@ def make_table(property):
         ],
         data=[],
         page_size=10,
+        page_current=0,
+        page_action="custom",
         editable=False,
         cell_selectable=True,
         # filter_action="native",
-        sort_action="native",
+        sort_action="custom",
+        sort_mode="single",
+        sort_by=[],
         style_table={"overflowX": "auto"},
         style_cell_conditional=[
             # Here, "whiteSpace": 'normal' is needed to have line breaks in the notes
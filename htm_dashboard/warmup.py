@@ -0,0 +1,123 @@
+import logging
+import time
+
+from htm_dashboard import ACTIVE_GROUPS, CLIENTSIDE_PANELS
+import htm_dashboard.callbacks as cb
+from .citations import citation_store
+from .graph import refresh_database, type_to_snapshot
+from .tab import initial_filters
+
+logger = logging.getLogger(__name__)
+
+# {(group, light theme): (version of the data, initial values)}, see
+# get_initial_panels
+_initial_panels = {}
+
+
+def compute_initial_panels(group: str, toggle_light: bool = True) -> dict:
+    """Computes the graphs of a tab for its initial filters. The table is
+    only computed when it is opened.
+
+    Args:
+        group (str): the group of properties (eg. "diffusivity")
+        toggle_light (bool, optional): the value of the theme switch, True for
+            the light theme. Defaults to True.
+
+    Returns:
+        dict: the initial values, see tab.make_tab
+    """
+    filters = initial_filters(group)
+    filters = (
+        filters["materials"],
+        filters["isotopes"],
+        filters["authors"],
+        filters["years"],
+    )
+    # callbacks computing the initial values and their arguments
+    steps = [
+        ("graph", cb.make_main_graph, (group, *filters, "property", toggle_light)),
+        (
+            "nb_citations",
+            cb.create_make_citations_figure_function(group),
+            (None, False, *filters),
+        ),
+    ]
+    if CLIENTSIDE_PANELS:
+        # the browser computes the pie charts and the histogram from this data
+        steps.append(
+            (
+                "panels_data",
+                cb.create_update_panels_data_function(group),
+                filters,
+            )
+        )
+    else:
+        steps += [
+            (
+                "prop_per_year",
+                cb.create_update_entries_per_year_graph_function(group),
+                (None, *filters),
+            ),
+            (
+                "materials",
+                cb.create_update_piechart_material_function(group),
+                (None, *filters),
+            ),
+            (
+                "isotopes",
+                cb.create_update_piechart_isotopes_function(group),
+                (None, *filters),
+            ),
+            (
+                "authors",
+                cb.create_update_piechart_authors_function(group),
+                (None, *filters),
+            ),
+        ]
+
+    initial = {}
+    for key, callback, args in steps:
+        start = time.perf_counter()
+        initial[key] = callback(*args)
+        duration = time.perf_counter() - start
+        logger.info(f"warm start: {group} {key} computed in {duration:.3f} s")
+    return initial
+
+
+def get_initial_panels(group: str, toggle_light: bool = True) -> dict:
+    """Returns the initial values of the graphs of a tab, computed again only
+    when the database or the citations changed since they were computed
+
+    Args:
+        group (str): the group of properties (eg. "diffusivity")
+        toggle_light (bool, optional): the value of the theme switch, True for
+            the light theme. Defaults to True.
+
+    Returns:
+        dict: the initial values, see compute_initial_panels
+    """
+    refresh_database(group)
+    version = (type_to_snapshot[group].columns.fingerprint, citation_store.date)
+    key = (group, bool(toggle_light))
+    cached = _initial_panels.get(key)
+    if cached is None or cached[0] != version:
+        cached = (version, compute_initial_panels(group, toggle_light))
+        _initial_panels[key] = cached
+    return cached[1]
+
+
+def warm_start(groups=ACTIVE_GROUPS) -> dict:
+    """Computes the initial graphs of some groups, with the light theme of
+    the theme switch on page load
+
+    Args:
+        groups (list, optional): the groups of properties. Defaults to
+            ACTIVE_GROUPS.
+
+    Returns:
+        dict: the initial values of each group
+    """
+    start = time.perf_counter()
+    initial = {group: get_initial_panels(group) for group in groups}
+    logger.info(f"warm start: done in {time.perf_counter() - start:.3f} s")
+    return initial
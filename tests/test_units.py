@@ -1,46 +1,778 @@
-from htm_dashboard.callbacks import create_make_download_data_function
 import h_transport_materials as htm
+import numpy as np
+import pandas as pd
+import dash
+import plotly
+import plotly.graph_objects as go
 
 from contextvars import copy_context
 from dash._callback_context import context_value
 from dash._utils import AttributeDict
 from datetime import datetime
+import flask
+import gzip
+import http.server
+import io
+import json
+import os
+import threading
+from datetime import timedelta
+
+from htm_dashboard.index import PropertyIndex
+from htm_dashboard.store import PropertyStore
+from htm_dashboard.memory import memory_usage
+from htm_dashboard.facets import make_options
+from htm_dashboard.metrics import instrument, phase, register_metrics_route
+import htm_dashboard.graph as graph
+from htm_dashboard.simplify import decimate_curve, round_significant
+from htm_dashboard.serialize import compact_figure, serialize_figure
+from htm_dashboard.query import FilterQuery
+from htm_dashboard.export import (
+    generate_python_code,
+    register_export_route,
+    export_url,
+)
+from htm_dashboard.cache import LRUCache, FigureCache
+from htm_dashboard.columns import (
+    PropertyColumns,
+    make_hovertemplate,
+    ACT_ENERGY_UNITS,
+)
+from htm_dashboard.citations import CitationStore, citation_store
+from htm_dashboard.cache_citations import CrossrefFetcher, refresh_citations
+from htm_dashboard.tab import make_tab
+from htm_dashboard.warmup import compute_initial_panels, get_initial_panels
+from htm_dashboard.layout import create_render_tabs_function
+from htm_dashboard import ACTIVE_GROUPS
 
 from htm_dashboard.callbacks import (
-    create_make_download_data_function,
+    create_update_export_link_function,
+    create_update_table_data_function,
     make_citations_graph,
+    create_update_tab_function,
+    make_main_graph,
+)
+from htm_dashboard.graph import (
+    get_group_of_properties,
+    get_selection,
+    add_property_to_database,
+    publish_snapshot,
+    refresh_database,
+    type_to_snapshot,
+    type_to_database,
+    filter_cache,
+    type_to_index,
+    type_to_columns,
+    arrhenius_curves,
+    make_panels_data,
+    make_piechart_materials,
+    count_years,
+    year_bins,
+    make_figure_prop_per_year,
 )
 
 
 def test_export_groups():
-    """Tests the export to json callback"""
-    export_fun = create_make_download_data_function("diffusivity")
+    """Tests the streaming export to json endpoint"""
+    server = flask.Flask(__name__)
+    register_export_route(server)
+    client = server.test_client()
 
-    def run_callback():
-        context_value.set(
-            AttributeDict(
-                **{
-                    "triggered_inputs": [
-                        {"prop_id": "extract_button_diffusivity.n_clicks"}
-                    ]
-                }
+    url = create_update_export_link_function("diffusivity")(
+        material_filter=["tungsten"],
+        author_filter=["frauenfelder"],
+        isotope_filter=["H", "D", "T"],
+        year_filter=None,
+    )[0]
+    response = client.get(url)
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["filters"]["authors"] == ["frauenfelder"]
+    assert len(data["data"]) > 0
+    assert all(prop["author"] == "frauenfelder" for prop in data["data"])
+
+    response = client.get(url + "&compact=1&gzip=1")
+    assert json.loads(gzip.decompress(response.data)) == data
+
+    response = client.get(url + "&year_min=1990&year_max=2000")
+    assert response.status_code == 200
+    for years in ["&year_min=abc&year_max=2000", "&year_min=1990"]:
+        assert client.get(url + years).status_code == 400
+
+
+def test_columnar_exports():
+    """Tests that the CSV, Parquet and Arrow exports contain the filtered
+    properties"""
+    server = flask.Flask(__name__)
+    register_export_route(server)
+    client = server.test_client()
+    query = FilterQuery.from_filters(["tungsten"], ["frauenfelder"], ["H", "D", "T"])
+    positions = query.positions(type_to_index["diffusivity"])
+
+    frames = {}
+    for fmt, read in [
+        ("csv", pd.read_csv),
+        ("parquet", pd.read_parquet),
+        ("arrow", pd.read_feather),
+    ]:
+        response = client.get(export_url("diffusivity", query, fmt))
+        assert response.status_code == 200
+        frames[fmt] = read(io.BytesIO(response.data))
+
+    for frame in frames.values():
+        assert len(frame) == len(positions)
+        assert (frame["author"] == "frauenfelder").all()
+    np.testing.assert_allclose(
+        frames["parquet"]["pre_exp"], type_to_columns["diffusivity"].pre_exp[positions]
+    )
+    assert htm.ureg(frames["arrow"]["pre_exp_units"][0]).check("[length]**2/[time]")
+
+
+def test_citation_graphs_per_year_same_year():
+    current_year = datetime.now().year
+
+    group = htm.PropertiesGroup(
+        [
+            htm.Diffusivity(
+                D_0=1, E_D=0, year=current_year, author="doe", material=htm.TUNGSTEN
             )
+        ]
+    )
+    make_citations_graph(PropertyColumns(group), np.arange(1), per_year=True)
+
+
+def test_citation_graph_top_references():
+    """Tests that the references beyond the top ones are aggregated and that
+    each reference appears once with the DOI of its first property"""
+    columns = type_to_columns["diffusivity"]
+    positions = np.arange(columns.size)
+    bars = make_citations_graph(columns, positions, per_year=False, top=0).data[0]
+    assert len(set(bars.y)) == len(bars.y) == len(columns.references)
+    assert list(bars.x) == sorted(bars.x)
+    dois = {}
+    for prop in columns.database:
+        dois.setdefault(f"{prop.author.capitalize()} ({prop.year})", prop.doi)
+    assert all(dois[y] in (doi, None) for y, doi in zip(bars.y, bars.customdata))
+
+    # a reference shows the DOI of its first selected property
+    label = next(label for label in dois if dois[label] is not None)
+    code = list(columns.references).index(label)
+    same_label = np.nonzero(columns.reference_codes == code)[0]
+    other = columns.database[same_label[-1]]
+    selected = make_citations_graph(columns, same_label[-1:], per_year=False)
+    assert list(selected.data[0].customdata) == [other.doi or "none"]
+
+    top = make_citations_graph(columns, positions, per_year=False, top=10).data[0]
+    assert len(top.y) == 11
+    assert top.y[0] == f"Others ({len(bars.y) - 10} references)"
+    assert list(top.y[1:]) == list(bars.y[-10:])
+    assert top.x[0] == sum(bars.x[:-10])
+
+
+def test_filter_cache_is_shared_and_invalidated():
+    """Tests that identical filters reuse the cached group and that adding
+    a property invalidates it"""
+    filters = dict(
+        materials=["tungsten"],
+        authors=["Frauenfelder"],
+        isotopes=["H", "D", "T"],
+        years=[1950, 2030],
+    )
+    group_1 = get_group_of_properties("diffusivity", **filters)
+    group_2 = get_group_of_properties(
+        "diffusivity",
+        materials=["tungsten", "tungsten"],
+        authors=["frauenfelder"],
+        isotopes=["T", "D", "H"],
+        years=(1950, 2030),
+    )
+    assert group_1 is group_2
+
+    new_prop = htm.Diffusivity(
+        D_0=1, E_D=0.1, author="frauenfelder", year=2000, isotope="H"
+    )
+    new_prop.material = htm.Material(name="tungsten")
+    snapshot = type_to_snapshot["diffusivity"]
+    add_property_to_database("diffusivity", new_prop)
+    try:
+        group_3 = get_group_of_properties("diffusivity", **filters)
+        assert group_3 is not group_1
+        assert new_prop in group_3
+        # the previous snapshot is left unchanged
+        assert new_prop not in snapshot.database
+        assert snapshot.columns.size == len(snapshot.database)
+    finally:
+        publish_snapshot("diffusivity", snapshot)
+
+
+def test_properties_shared_through_store(tmp_path, monkeypatch):
+    """Tests that a property added to the store by a worker is added to the
+    database of the other workers"""
+    filename = tmp_path / "properties.sqlite"
+    other_worker_store = PropertyStore(filename)
+    monkeypatch.setattr(graph, "property_store", PropertyStore(filename))
+    monkeypatch.setattr(graph, "_store_ids", {})
+    snapshot = type_to_snapshot["diffusivity"]
+    fields = {
+        "pre_exp": 1,
+        "act_energy": 0.1,
+        "author": "Smith",
+        "year": 2000,
+        "isotope": "H",
+        "material": "tungsten",
+        "range": [300, 1200],
+    }
+    other_worker_store.add("diffusivity", fields)
+    try:
+        refresh_database("diffusivity", force=True)
+        database = type_to_database["diffusivity"]
+        assert len(database) == len(snapshot.database) + 1
+        assert database[-1].author == "smith"
+        assert type_to_columns["diffusivity"].size == len(database)
+
+        # nothing new in the store
+        refresh_database("diffusivity", force=True)
+        assert type_to_database["diffusivity"] is database
+    finally:
+        publish_snapshot("diffusivity", snapshot)
+
+
+def test_frozen_snapshots_still_accept_properties(monkeypatch):
+    """Tests that the arrays shared with the forked workers are read-only and
+    that properties can still be added and filtered"""
+    snapshot = type_to_snapshot["diffusivity"]
+    # the snapshots of the other tests are left writeable
+    frozen = graph.make_snapshot(snapshot.database)
+    monkeypatch.setattr(graph, "type_to_snapshot", {"diffusivity": frozen})
+    graph.freeze_snapshots()
+    assert not frozen.columns.year.flags.writeable
+    assert snapshot.columns.year.flags.writeable
+
+    new_prop = htm.Diffusivity(D_0=1, E_D=0.1, author="smith", year=2000, isotope="H")
+    new_prop.material = htm.Material(name="tungsten")
+    add_property_to_database("diffusivity", new_prop)
+    try:
+        query = FilterQuery.from_filters(["tungsten"], ["smith"], ["H"], None)
+        selection = get_selection("diffusivity", query)
+        assert list(selection.group) == [new_prop]
+        assert memory_usage()["private"] > 0
+    finally:
+        publish_snapshot("diffusivity", snapshot)
+
+
+def test_store_reconnects_after_fork(tmp_path):
+    """Tests that a forked worker opens its own connection to the store"""
+    store = PropertyStore(tmp_path / "properties.sqlite")
+    store.add("diffusivity", {"author": "smith"})
+    connection = store.connection
+    # simulates the process id of a forked worker
+    store._pid = None
+    assert store.connection is not connection
+    assert store.rows("diffusivity") == [(1, {"author": "smith"})]
+
+
+def test_filter_query_is_canonical():
+    """Tests that equivalent filters give equal queries and that the
+    generated script uses the canonical values"""
+    query_1 = FilterQuery.from_filters(
+        ["tungsten", "steel"], ["Frauenfelder"], ["H", "D"], [1950, 2000]
+    )
+    query_2 = FilterQuery.from_filters(
+        ["steel", "tungsten"], ["frauenfelder"], ["d", "h"], (1950.0, 2000.0)
+    )
+    assert query_1 == query_2
+    assert hash(query_1) == hash(query_2)
+    assert query_1.without_years().years is None
+    assert FilterQuery.from_filters(["tungsten"], [], ["H"]).is_empty
+
+    script = generate_python_code(query_1, group="diffusivity")
+    assert "author=['frauenfelder']" in script
+    assert "isotope=['d', 'h']" in script
+    assert "np.arange(1950, 2001" in script
+
+
+def test_index_query_matches_htm_filter():
+    """Tests that the inverted index selects the same properties as
+    PropertiesGroup.filter"""
+    index = PropertyIndex(htm.diffusivities)
+    positions = index.query(
+        materials=["tungsten", "steel"],
+        authors=["frauenfelder", "heinola", "grant"],
+        isotopes=["h", "d"],
+        years=(1960, 2010),
+    )
+    expected = (
+        htm.diffusivities.filter(material=["tungsten", "steel"])
+        .filter(author=["frauenfelder", "heinola", "grant"])
+        .filter(isotope=["h", "d"])
+        .filter(year=list(range(1960, 2011)))
+    )
+    assert [htm.diffusivities[i] for i in positions] == expected
+
+
+def test_columns_table_rows_match_pint_formatting():
+    """Tests that the table rows built from the columnar snapshot are the same
+    as the ones formatted by pint"""
+    columns = PropertyColumns(htm.diffusivities)
+    positions = np.arange(len(htm.diffusivities))
+    for prop, row in zip(htm.diffusivities, columns.table_rows(positions)):
+        assert row["pre_exp"] == f"{prop.pre_exp: .2e~P}"
+        assert row["act_energy"] == f"{prop.act_energy:.2f~P}"
+        assert row["range"] == f"{prop.range[0]:.0f~P}-{prop.range[1]:.0f~P}"
+        assert row["material"] == prop.material.name
+
+
+def test_arrhenius_curves_match_property_values():
+    """Tests that the batched evaluation of the curves gives the same values
+    as Property.value"""
+    columns = type_to_columns["diffusivity"]
+    positions = np.arange(0, columns.size, 7)
+    T, values = arrhenius_curves(columns, positions, num=50)
+    for i, T_prop, values_prop in zip(positions, T, values):
+        prop = htm.diffusivities[i]
+        expected = prop.value(T_prop * htm.ureg.K).magnitude
+        assert np.allclose(values_prop, expected, rtol=1e-10)
+
+
+def test_update_tab_returns_all_panels():
+    """Tests the fused callback updating a whole tab"""
+    update_tab = create_update_tab_function("diffusivity")
+
+    def run_callback(prop_id):
+        context_value.set(
+            AttributeDict(**{"triggered_inputs": [{"prop_id": prop_id}]})
         )
-        return export_fun(
-            1,
-            material_filter=["tungsten"],
-            author_filter=["frauenfelder"],
-            isotope_filter=["H", "D", "T"],
-            year_filter=None,
+        return update_tab(
+            ["tungsten"],
+            ["H", "D", "T"],
+            ["Frauenfelder"],
+            [1950, 2030],
+            0,
+            "property",
+            True,
+            False,
         )
 
-    ctx = copy_context()
-    output = ctx.run(run_callback)
-    assert type(output["content"]) == str
+    outputs = copy_context().run(run_callback, "material_filter_diffusivity.value")
+    # the graph, the citations and the data of the panels computed in the browser
+    assert len(outputs) == 3
 
+    outputs = copy_context().run(run_callback, "per_year_citations_diffusivity.on")
+    assert outputs[1] is not dash.no_update
+    assert all(out is dash.no_update for i, out in enumerate(outputs) if i != 1)
 
-def test_citation_graphs_per_year_same_year():
-    current_year = datetime.now().year
 
-    group = htm.PropertiesGroup([htm.Property(year=current_year)])
-    make_citations_graph(group, per_year=True)
+def test_panels_data_counts_match_piecharts():
+    """Tests that the data of the panels computed in the browser gives the
+    counts of the pie charts computed on the server"""
+    columns = type_to_columns["diffusivity"]
+    materials = type_to_snapshot["diffusivity"].facets.materials()
+    query = FilterQuery.from_filters(
+        materials, list(columns.authors), ["H", "D", "T"], [1990, 2010]
+    )
+    all_years = query.without_years().positions(type_to_index["diffusivity"])
+    data = make_panels_data(columns, all_years, selected_years=[1990, 2010])
+    assert len(data["year"]) == len(all_years)
+
+    selected = np.array(
+        [year is not None and 1990 <= year <= 2010 for year in data["year"]]
+    )
+    codes = np.array(data["material"]["codes"])[selected]
+    counts = np.bincount(codes, minlength=len(data["material"]["labels"]))
+    labels = data["material"]["labels"]
+    expected = make_piechart_materials(
+        columns, query.positions(type_to_index["diffusivity"])
+    ).data[0]
+    assert dict(zip(expected.labels, expected.values)) == {
+        labels[code]: count for code, count in enumerate(counts) if count > 0
+    }
+    # same colours as the server pie chart, hence as the main graph
+    colours = dict(zip(labels, data["material"]["colours"]))
+    assert [colours[label] for label in expected.labels] == list(
+        expected.marker.colors
+    )
+
+
+def test_year_bins_match_direct_count():
+    """Tests that the bins read from the cumulative counts per year hold the
+    properties of their years, whatever the width of the bins"""
+    years = type_to_columns["diffusivity"].year
+    known = years[~np.isnan(years)].astype(int)
+    year_counts = count_years(years)
+    for step in [1, 2, 5, 10]:
+        starts, counts = year_bins(year_counts, step)
+        assert np.all(starts % step == 0)
+        assert counts.sum() == len(known)
+        for start, count in zip(starts, counts):
+            assert count == np.sum((start <= known) & (known < start + step))
+
+        figure = make_figure_prop_per_year(year_counts, step, [1990, 2010])
+        assert figure.data[0].width == step
+        assert list(figure.data[0].x) == list(starts + 0.5 * (step - 1))
+
+    starts, counts = year_bins(count_years([np.nan]), 5)
+    assert len(starts) == len(counts) == 0
+
+
+def test_facets_match_database_and_follow_additions():
+    """Tests that the facets give the authors of the properties of some
+    materials, and that added properties are counted in a new index only"""
+    snapshot = type_to_snapshot["diffusivity"]
+    facets = snapshot.facets
+    counts = facets.author_counts(["tungsten", "metal"])
+    authors = [
+        prop.author.capitalize()
+        for prop in snapshot.database
+        if prop.material in ["tungsten", "metal"]
+    ]
+    assert counts == {author: authors.count(author) for author in sorted(authors)}
+    assert set(facets.materials()) == set(snapshot.index.keys("material")) - {
+        prop.material.symbol
+        for prop in snapshot.database
+        if getattr(prop.material, "symbol", None)
+    }
+
+    new_prop = htm.Diffusivity(D_0=1, E_D=0.1, author="smith", year=2000, isotope="H")
+    new_prop.material = htm.Material(name="tungsten")
+    database = htm.PropertiesGroup(list(snapshot.database) + [new_prop])
+    new_facets = facets.copy_with(database)
+    assert new_facets.author_counts(["tungsten"])["Smith"] == 1
+    assert "Smith" not in facets.author_counts(["tungsten"])
+    assert new_facets.material_counts()["tungsten"] == (
+        facets.material_counts()["tungsten"] + 1
+    )
+    assert make_options({"tungsten": 42}, show_counts=True) == [
+        {"label": "tungsten (42)", "value": "tungsten"}
+    ]
+
+
+def test_table_sorted_and_paged_on_server():
+    """Tests that the table callback returns the requested page of the sorted
+    rows, and nothing while the table is hidden"""
+    update_table = create_update_table_data_function("diffusivity")
+    authors = type_to_columns["diffusivity"].authors.tolist()
+    materials = type_to_snapshot["diffusivity"].facets.materials()
+    filters = (materials, ["H", "D", "T"], authors, None)
+    positions = FilterQuery.from_filters(materials, authors, ["H", "D", "T"]).positions(
+        type_to_index["diffusivity"]
+    )
+
+    def run_callback(
+        prop_id, active_subtab, page_current, sort_by, table_filters, filters=filters
+    ):
+        context_value.set(
+            AttributeDict(**{"triggered_inputs": [{"prop_id": prop_id}]})
+        )
+        return update_table(
+            active_subtab, page_current, 10, sort_by, *filters, table_filters
+        )
+
+    outputs = copy_context().run(
+        run_callback, "subtabs_diffusivity.active_tab", "graph", 0, [], None
+    )
+    assert all(output is dash.no_update for output in outputs)
+
+    # opening the table for the first time shows its first page
+    _, _, page_current, table_filters = copy_context().run(
+        run_callback, "subtabs_diffusivity.active_tab", "table", 2, [], None
+    )
+    assert page_current == 0
+
+    sort_by = [{"column_id": "act_energy", "direction": "desc"}]
+    rows, page_count, page_current, _ = copy_context().run(
+        run_callback,
+        "table_diffusivity.page_current",
+        "table",
+        2,
+        sort_by,
+        table_filters,
+    )
+    assert len(rows) == 10
+    assert page_count == -(-len(positions) // 10)
+    assert page_current == 2
+
+    energies = np.sort(type_to_columns["diffusivity"].act_energy[positions])[::-1]
+    assert [row["act_energy"] for row in rows] == [
+        f"{energy:.2f} {ACT_ENERGY_UNITS}" for energy in energies[20:30]
+    ]
+
+    # setting a filter to the same values keeps the page
+    _, _, page_current, _ = copy_context().run(
+        run_callback,
+        "material_filter_diffusivity.value",
+        "table",
+        2,
+        sort_by,
+        table_filters,
+    )
+    assert page_current == 2
+
+    # changing the filters goes back to the first page
+    new_filters = (materials, ["H"], authors, None)
+    _, _, page_current, _ = copy_context().run(
+        run_callback,
+        "isotope_filter_diffusivity.value",
+        "table",
+        2,
+        sort_by,
+        table_filters,
+        new_filters,
+    )
+    assert page_current == 0
+
+
+def test_citation_store_reloads_when_file_changes(tmp_path):
+    """Tests that the citations file is only read again when it changes"""
+    filename = tmp_path / "citations.json"
+    filename.write_text(json.dumps({"date": "2022-01-01", "dois": {"a": 1}}))
+    store = CitationStore(filename)
+    assert store.date == "2022-01-01"
+    assert store.dois == {"a": 1}
+
+    filename.write_text(json.dumps({"date": "2023-01-01", "dois": {"a": 2}}))
+    os.utime(filename, (0, 0))
+    assert store.date == "2023-01-01"
+    assert store.dois == {"a": 2}
+
+
+def test_citation_store_array_aligned_with_columns():
+    """Tests the number of citations array of a columnar snapshot"""
+    columns = type_to_columns["diffusivity"]
+    nb_citations = citation_store.citations(columns)
+    assert nb_citations.shape == (columns.size,)
+    for prop, nb in zip(htm.diffusivities[:10], nb_citations):
+        assert nb == citation_store.nb_citations(prop)
+    assert citation_store.citations(columns) is nb_citations
+
+
+def test_citation_store_arrays_follow_snapshots(tmp_path):
+    """Tests that snapshots of the same size with other DOIs don't share their
+    citations and that the cached arrays are bounded"""
+    props = [prop for prop in htm.diffusivities if prop.doi][:10]
+    filename = tmp_path / "citations.json"
+    dois = {prop.doi: i for i, prop in enumerate(props)}
+    filename.write_text(json.dumps({"date": "2022-01-01", "dois": dois}))
+    store = CitationStore(filename, maxsize=2)
+
+    first = PropertyColumns(htm.PropertiesGroup(props[:5]))
+    second = PropertyColumns(htm.PropertiesGroup(props[5:]))
+    assert list(store.citations(first)) == [dois[prop.doi] for prop in props[:5]]
+    assert list(store.citations(second)) == [dois[prop.doi] for prop in props[5:]]
+    store.citations(first, per_year=True)
+    assert len(store._arrays) == 2
+
+
+def test_main_graph_template_follows_theme():
+    """Tests that the theme of a main graph is set on the figure, leaving the
+    default template shared by the threads unchanged"""
+    default = plotly.io.templates.default
+    filters = (["tungsten"], ["H"], ["Frauenfelder"], None)
+    dark = make_main_graph("diffusivity", *filters, toggle_light=False)
+    light = make_main_graph("diffusivity", *filters, toggle_light=True)
+    assert dark["layout"]["template"] != light["layout"]["template"]
+    assert plotly.io.templates.default == default
+
+
+def test_figure_cache_shared_through_directory(tmp_path):
+    """Tests that a figure cached by one worker is reused by another one"""
+    cache_worker_1 = FigureCache(directory=tmp_path)
+    cache_worker_2 = FigureCache(directory=tmp_path)
+    key = ("diffusivity", "fingerprint", (("tungsten",), (), (), None), True)
+
+    assert cache_worker_2.get(key) is None
+    figure = cache_worker_1.set(key, go.Figure(go.Scatter(x=[1, 2], y=[3, 4])))
+    assert cache_worker_2.get(key) == figure
+
+
+def test_lru_cache_ttl():
+    """Tests that entries expire after their time to live"""
+    cache = LRUCache(maxsize=2, ttl=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+    cache = LRUCache(maxsize=2)
+    for key in ["a", "b", "c"]:
+        cache.set(key, key)
+    assert "a" not in cache and cache.get("c") == "c"
+
+
+def test_warm_start_panels_in_tab():
+    """Tests that the precomputed panels are included in the tab"""
+    initial = compute_initial_panels("dissociation_coeff")
+    assert set(initial) == {"graph", "nb_citations", "panels_data"}
+    tab = make_tab("dissociation_coeff", initial)
+    assert json.dumps(initial["graph"]) in json.dumps(
+        tab.to_plotly_json(), cls=plotly.utils.PlotlyJSONEncoder
+    )
+
+
+def test_initial_panels_follow_database():
+    """Tests that the initial graphs of the page are computed again once
+    properties were added"""
+    initial = get_initial_panels("diffusivity")
+    assert get_initial_panels("diffusivity") is initial
+
+    new_prop = htm.Diffusivity(D_0=1, E_D=0.1, author="smith", year=2000, isotope="H")
+    new_prop.material = htm.Material(name="tungsten")
+    snapshot = type_to_snapshot["diffusivity"]
+    add_property_to_database("diffusivity", new_prop)
+    try:
+        assert get_initial_panels("diffusivity") is not initial
+    finally:
+        publish_snapshot("diffusivity", snapshot)
+    assert get_initial_panels("diffusivity") == initial
+
+    # the graphs of the dark theme are cached separately
+    dark = get_initial_panels("diffusivity", toggle_light=False)
+    assert dark["graph"]["layout"]["template"] != initial["graph"]["layout"]["template"]
+    assert get_initial_panels("diffusivity", toggle_light=False) is dark
+
+
+def test_render_tabs_only_once():
+    """Tests that the content of a tab is rendered the first time it's opened"""
+    render_tabs = create_render_tabs_function()
+
+    outputs = render_tabs("solubility", ["diffusivity"])
+    assert outputs[-1] == ["diffusivity", "solubility"]
+    assert outputs[ACTIVE_GROUPS.index("solubility")] is not dash.no_update
+
+    outputs = render_tabs("solubility", ["diffusivity", "solubility"])
+    assert all(output is dash.no_update for output in outputs)
+
+
+def test_decimated_curves_within_tolerance():
+    """Tests that the decimated curves stay within the tolerance in log space
+    and that the rounded values are serialized with few digits"""
+    T = np.linspace(300, 1200, num=500)
+    x = 1 / T
+    y = 1e-7 * np.exp(-0.5 / (8.617e-5 * T)) + 1e-9 * np.exp(-0.05 / (8.617e-5 * T))
+    tolerance = 1e-3
+
+    keep = decimate_curve(x, y, tolerance, min_points=10)
+    assert 10 <= len(keep) < 100
+    assert keep[0] == 0 and keep[-1] == len(x) - 1
+    # x = 1/T is decreasing
+    interpolated = np.interp(x, x[keep][::-1], np.log10(y[keep])[::-1])
+    error = np.abs(interpolated - np.log10(y))
+    assert error.max() <= tolerance
+
+    rounded = round_significant(y, 4)
+    assert all(len(repr(value).split("e")[0]) <= 6 for value in rounded)
+    np.testing.assert_allclose(rounded, y, rtol=1e-3)
+
+
+def test_compact_figure():
+    """Tests that the compact serializer collapses repeated labels and prunes
+    the template"""
+    x = np.linspace(1e-3, 3e-3, num=20)
+    fig = go.Figure(
+        go.Scatter(x=x, y=np.exp(-x), text=["Mean value"] * len(x)),
+        layout=dict(template="plotly_white"),
+    )
+    figure = compact_figure(serialize_figure(fig))
+
+    trace = figure["data"][0]
+    assert trace["text"] == "Mean value"
+    assert list(figure["layout"]["template"]["data"]) == ["scatter"]
+    np.testing.assert_allclose(trace["x"], x)
+
+
+def test_columns_format_appended_properties_only():
+    """Tests that the hover templates and the table rows are formatted once
+    per property and extended when a property is appended"""
+    database = htm.PropertiesGroup(list(htm.diffusivities)[:10])
+    columns = PropertyColumns(database)
+    hovertemplates = list(columns.hovertemplates)
+    rows = columns.table_rows(np.arange(columns.size))
+
+    new_prop = htm.Diffusivity(D_0=1, E_D=0.1, author="smith", year=2000, isotope="H")
+    new_prop.material = htm.Material(name="tungsten")
+    columns = columns.copy_with(htm.PropertiesGroup(list(database) + [new_prop]))
+
+    assert all(a is b for a, b in zip(columns.hovertemplates, hovertemplates))
+    assert columns.table_rows(np.arange(10)) == rows
+    assert columns.hovertemplates[-1] == make_hovertemplate(new_prop)
+    assert columns.labels[-1] == "H Smith (2000)"
+    assert columns.table_rows([10])[0]["author"] == "smith"
+
+
+def test_callbacks_metrics_endpoint(monkeypatch):
+    """Tests that the timings, cache requests and response sizes of the
+    instrumented callbacks are exposed on /metrics"""
+    monkeypatch.setattr("htm_dashboard.metrics.METRICS", True)
+    server = flask.Flask(__name__)
+    register_metrics_route(server)
+
+    def update_graph():
+        query = FilterQuery.from_filters(["tungsten"], ["frauenfelder"], ["H"])
+        graph.get_selection("diffusivity", query)
+        with phase("figure"):
+            return "x" * 100
+
+    callback = instrument(update_graph, group="metrics_test")
+    server.add_url_rule("/update", "update", callback)
+    client = server.test_client()
+    filter_cache.invalidate()
+    for _ in range(2):
+        client.get("/update")
+
+    metrics = client.get("/metrics").get_data(as_text=True).splitlines()
+    labels = 'group="metrics_test",callback="update_graph"'
+    name = "htm_dashboard_callback"
+    assert f'{name}_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in metrics
+    assert f"{name}_duration_seconds_count{{{labels}}} 2" in metrics
+    assert f'{name}_phase_seconds_count{{{labels},phase="figure"}} 2' in metrics
+    assert f"{name}_response_bytes_sum{{{labels}}} 200" in metrics
+    # the selection is computed once then taken from the filter cache
+    for result in ["hit", "miss"]:
+        cache_labels = f'{labels},cache="filter",result="{result}"'
+        assert f"htm_dashboard_cache_requests_total{{{cache_labels}}} 1" in metrics
+
+
+def test_citations_refresh_is_incremental(tmp_path):
+    """Tests the citations refresh against a local stub of the Crossref API:
+    each DOI is fetched once, failed lookups are retried by the next run"""
+    requested = []
+    unavailable = {"10.1/down"}
+
+    class CrossrefStub(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            doi = self.path.split("/works/")[1].replace("%2F", "/")
+            requested.append(doi)
+            if doi in unavailable:
+                self.send_error(503)
+                return
+            body = json.dumps({"message": {"is-referenced-by-count": len(doi)}})
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), CrossrefStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fetcher = CrossrefFetcher(f"http://127.0.0.1:{server.server_port}")
+    filename = tmp_path / "citations.json"
+    dois = ["10.1/a", "10.1/bb", "10.1/a", "10.1/down"]
+    options = dict(filename=filename, fetcher=fetcher, rate=None, backoff=0)
+    try:
+        data = refresh_citations(dois, retries=2, **options)
+        assert sorted(requested) == ["10.1/a", "10.1/bb", "10.1/down", "10.1/down"]
+        assert data["dois"] == {"10.1/a": 6, "10.1/bb": 7}
+        assert data["date"] is None
+        assert CitationStore(filename).dois == data["dois"]
+
+        # only the failed DOI is fetched again
+        requested.clear()
+        unavailable.clear()
+        data = refresh_citations(dois, **options)
+        assert requested == ["10.1/down"]
+        assert data["date"] is not None
+
+        # all the DOIs are stale
+        requested.clear()
+        refresh_citations(dois, max_age=timedelta(0), **options)
+        assert sorted(requested) == ["10.1/a", "10.1/bb", "10.1/down"]
+    finally:
+        server.shutdown()
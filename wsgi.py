@@ -0,0 +1,16 @@
+"""Production entry point, loaded once by the gunicorn master (preload_app in
+gunicorn.conf.py) before forking the workers.
+
+The databases, their indexes and columns and the warm start figures are
+built here, so the workers share their memory pages (copy on write) instead
+of each building its own copy."""
+
+from app import app, server
+from htm_dashboard.graph import freeze_snapshots
+from htm_dashboard.memory import freeze_heap
+
+# the shared arrays are replaced, never modified, when properties are added
+freeze_snapshots()
+# the garbage collections of the workers would otherwise write to the pages
+# of every object built so far
+freeze_heap()